@@ -0,0 +1,21 @@
+# scripts/create_tag_index.py
+import sys
+import os
+from dotenv import load_dotenv
+
+# Add the project root to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+from search_smith import create_tag_index  # noqa: E402
+
+def main():
+    """
+    Main function to build the tag index from the existing database.
+    """
+    print("🚀 Starting Tag Index Creation...")
+    load_dotenv()
+    create_tag_index()
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,11 @@ import uvicorn
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
-from search_smith import get_retriever, recommend_problems_api
+from search_smith import get_retriever, get_tag_router, recommend_problems_api
+from search_smith.profiler import install_profiling, to_thread
 
 app = FastAPI()
+install_profiling(app)
 
 class Query(BaseModel):
     text: str
@@ -23,8 +25,9 @@ async def startup_event():
     Load the retriever model on startup.
     """
     load_dotenv()
-    global retriever
+    global retriever, router
     retriever = get_retriever()
+    router = get_tag_router()
     if not retriever:
         print("Error: Could not initialize retriever.")
         # In a real application, you might want to handle this more gracefully
@@ -38,7 +41,8 @@ async def query_database(query: Query):
     if not retriever:
         return {"error": "Retriever not initialized"}
 
-    recommended = recommend_problems_api(retriever, query.text)
+    # Run the blocking search off the event loop (and inside the profile when enabled).
+    recommended = await to_thread(recommend_problems_api, retriever, query.text, router)
     return {"recommended_problems": recommended}
 
 def main():
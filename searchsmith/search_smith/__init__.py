@@ -10,8 +10,8 @@ __version__ = "0.2.0"
 from . import config
 from .llm_handler import  get_huggingface_llm, load_prompt_template
 from .document_processor import create_langchain_json
-from .db_creator import create_vector_database
-from .db_querier import get_retriever, recommend_problems , recommend_problems_api
+from .db_creator import create_vector_database, create_tag_index
+from .db_querier import get_retriever, recommend_problems , recommend_problems_api, get_tag_router, TagRouter
 
 # You can define what `from search_smith import *` will import
 __all__ = [
@@ -20,7 +20,10 @@ __all__ = [
     "load_prompt_template",
     "create_langchain_json",
     "create_vector_database",
+    "create_tag_index",
     "get_retriever",
     "recommend_problems" ,
-    "recommend_problems_api"
+    "recommend_problems_api",
+    "get_tag_router",
+    "TagRouter"
 ]
@@ -1,4 +1,5 @@
 # search_smith/config.py
+import os
 from pathlib import Path
 
 # --- Project Root ---
@@ -23,3 +24,32 @@ PROMPT_FILE_PATH = PROJECT_ROOT / "prompts" / "tagger.txt"
 
 # --- Retriever Settings ---
 SEARCH_KWARGS = {"k": 5}
+
+# --- Tag Routing ---
+# Per-tag centroids and ranked problem lists, built together with the vector store.
+TAG_INDEX_PATH = DATABASES_DIR / "tag_index.json"
+# Minimum difflib similarity for a query word to count as a (misspelled) tag.
+TAG_ROUTER_FUZZY_CUTOFF = 0.8
+# Only single words at least this long are fuzzy-matched, so short English words
+# ("track") are not mistaken for short tags ("stack")
+TAG_ROUTER_FUZZY_MIN_LENGTH = 6
+# Common abbreviations users type instead of the tag names in the prompt's tag list
+TAG_ALIASES = {
+    "dp": "dynamic-programming",
+    "dsu": "union-find",
+    "bs": "binary-search",
+    "prefix-sums": "prefix-sum",
+    "strings": "string",
+    "trees": "tree",
+    "graphs": "graph",
+}
+# Queries naming more tags than this go through the full vector search.
+TAG_ROUTER_MAX_TAGS = 2
+
+# --- Request Profiling ---
+# Disabled unless SEARCHSMITH_PROFILE=1. A request is profiled when it sends
+# the "X-Profile: 1" header or is picked by the sampling rate.
+PROFILE_ENABLED = os.getenv("SEARCHSMITH_PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("SEARCHSMITH_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = Path(os.getenv("SEARCHSMITH_PROFILE_DIR", str(PROJECT_ROOT / "profiles")))
+PROFILE_KEEP = int(os.getenv("SEARCHSMITH_PROFILE_KEEP", "50"))
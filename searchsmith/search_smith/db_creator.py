@@ -1,5 +1,7 @@
 # search_smith/db_creator.py
 import json
+import re
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from langchain_core.documents import Document
@@ -53,12 +55,91 @@ def create_vector_database():
         print("✅ Embedding model loaded.")
 
         print(f"Creating and persisting Vector Store to '{config.VECTOR_STORE_PATH}'...")
-        Chroma.from_documents(
+        vector_store = Chroma.from_documents(
             documents=documents_for_db,
             embedding=embeddings,
             persist_directory=str(config.VECTOR_STORE_PATH)
         )
         print("\n🎉 Vector Store created successfully!")
 
+        print("\n--- 3. Building Tag Index ---")
+        build_tag_index(vector_store)
+
     except Exception as e:
         print(f"\n❌ An error occurred: {e}")
+
+def load_tag_vocabulary(prompt_file_path=config.PROMPT_FILE_PATH) -> list:
+    """
+    Reads the tag vocabulary from the 'Provided Tag List' in the tagger prompt.
+    """
+    with open(prompt_file_path, 'r', encoding='utf-8') as f:
+        prompt = f.read()
+
+    match = re.search(r"Provided Tag List:(.*?)Problem:", prompt, re.DOTALL)
+    if not match:
+        return []
+    return [tag.strip().lower() for tag in re.split(r"[,\n]", match.group(1)) if tag.strip()]
+
+def extract_tags(tags, vocabulary) -> list:
+    """
+    Returns the vocabulary tags found in a document's tags.
+
+    The stored tags may still contain the tagger's reasoning (e.g. "...</think>\\n\\ngreedy"),
+    so only the last line of each entry is kept and anything outside the vocabulary is dropped.
+    """
+    if isinstance(tags, str):
+        tags = tags.split(',')
+
+    found = []
+    for tag in tags:
+        tag = tag.strip().split('\n')[-1].strip(" '\".").lower()
+        if tag in vocabulary and tag not in found:
+            found.append(tag)
+    return found
+
+def build_tag_index(vector_store):
+    """
+    Precomputes a centroid embedding and a ranked problem list for every tag and
+    saves them to config.TAG_INDEX_PATH, so tag-only queries can skip the vector search.
+
+    Problems of a tag are ranked by cosine similarity to the tag's centroid.
+    """
+    vocabulary = load_tag_vocabulary()
+    data = vector_store.get(include=["embeddings", "metadatas"])
+
+    members = {}
+    for embedding, metadata in zip(data["embeddings"], data["metadatas"]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        for tag in extract_tags(metadata.get('tags', ''), vocabulary):
+            members.setdefault(tag, []).append((metadata.get('problem_name', 'N/A'), vector))
+
+    tags = {}
+    for tag, problems in sorted(members.items()):
+        vectors = np.stack([vector for _, vector in problems])
+        centroid = vectors.mean(axis=0)
+        centroid /= np.linalg.norm(centroid) or 1.0
+        scores = vectors @ centroid
+        ranked = sorted(zip((name for name, _ in problems), scores.tolist()), key=lambda item: -item[1])
+        tags[tag] = {
+            "centroid": centroid.round(6).tolist(),
+            "problems": [{"problem_name": name, "score": round(score, 6)} for name, score in ranked],
+        }
+
+    config.TAG_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(config.TAG_INDEX_PATH, 'w', encoding='utf-8') as f:
+        json.dump({"vocabulary": vocabulary, "tags": tags}, f, ensure_ascii=False)
+    print(f"✅ Tag index with {len(tags)} tags saved to '{config.TAG_INDEX_PATH}'")
+
+def create_tag_index():
+    """
+    Builds the tag index from an existing Vector Store without re-embedding the documents.
+    """
+    if not os.path.exists(config.VECTOR_STORE_PATH):
+        print(f"❌ Database not found at '{config.VECTOR_STORE_PATH}'")
+        print("Please run 'create_database.py' first.")
+        return
+
+    print(f"Loading Vector Store from '{config.VECTOR_STORE_PATH}'...")
+    vector_store = Chroma(persist_directory=str(config.VECTOR_STORE_PATH))
+    build_tag_index(vector_store)
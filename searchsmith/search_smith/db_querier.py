@@ -1,5 +1,8 @@
 # search_smith/db_querier.py
 import os
+import re
+import json
+import difflib
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEndpointEmbeddings
 from . import config
@@ -64,19 +67,126 @@ def recommend_problems(retriever, query: str):
         print(f"  Content: {display_content[:200]}...") # Display a snippet
         print("-" * (len(problem_name) + 14))
 
-def recommend_problems_api(retriever, query: str):
+def recommend_problems_api(retriever, query: str, router=None):
     """
     Takes a retriever and a query, then returns a list of recommended problem names.
+
+    If a TagRouter is given and the query only names known tags, the answer comes
+    from the precomputed tag lists without calling the embedder or the vector store.
+    Tags with fewer than k problems are padded with the full search results.
     """
+    k = config.SEARCH_KWARGS["k"]
+    routed = router.route(query, k=k) if router is not None else None
+    if routed is not None:
+        print(f"\n🏷️  Answered '{query}' from the tag index: {routed}")
+        if len(routed) >= k:
+            return routed
+
     print(f"\n🔎 Searching for: '{query}'")
     relevant_docs = retriever.invoke(query)
 
     if not relevant_docs:
-        return []
+        return routed or []
 
     recommended_problems = []
     for doc in relevant_docs:
         problem_name = doc.metadata.get('problem_name', 'N/A')
         recommended_problems.append(problem_name)
 
+    if routed is not None:
+        recommended_problems = routed + [name for name in recommended_problems if name not in routed]
+        return recommended_problems[:k]
+
     return recommended_problems
+
+class TagRouter:
+    """
+    Answers queries that consist only of tag names (e.g. "bfs", "dp, greedy")
+    straight from the precomputed per-tag problem lists.
+    """
+
+    # Words that may join tag names in a query without making it a free-text query.
+    SEPARATORS = r"\s*(?:,|/|&|\+|\band\b|\bor\b)\s*"
+
+    def __init__(self, index: dict, fuzzy_cutoff: float = config.TAG_ROUTER_FUZZY_CUTOFF,
+                 fuzzy_min_length: int = config.TAG_ROUTER_FUZZY_MIN_LENGTH,
+                 max_tags: int = config.TAG_ROUTER_MAX_TAGS):
+        self.vocabulary = index["vocabulary"]
+        self.problems = {tag: entry["problems"] for tag, entry in index.get("tags", {}).items()}
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.fuzzy_min_length = fuzzy_min_length
+        self.max_tags = max_tags
+
+    def _match(self, phrase: str, fuzzy: bool = True):
+        candidate = re.sub(r"[\s_]+", "-", phrase.strip().lower())
+        candidate = config.TAG_ALIASES.get(candidate, candidate)
+        if candidate in self.vocabulary:
+            return candidate
+
+        # Fuzzy matching is only for typos in a single word: multi-word phrases and
+        # short words are left to the full search, and a word may be at most one
+        # character shorter than the tag and never longer, so "algorithm" does not
+        # become "z-algorithm".
+        if not fuzzy or "-" in candidate or len(candidate) < self.fuzzy_min_length:
+            return None
+        tags = [tag for tag in self.vocabulary if len(tag) - 1 <= len(candidate) <= len(tag)]
+        close = difflib.get_close_matches(candidate, tags, n=1, cutoff=self.fuzzy_cutoff)
+        return close[0] if close else None
+
+    def match_tags(self, query: str):
+        """
+        Returns the tags named by the query, or None if any part of it is not a tag.
+        """
+        # Tags such as "divide-and-conquer" contain a separator word.
+        tag = self._match(query, fuzzy=False)
+        if tag is not None:
+            return [tag]
+
+        tags = []
+        for phrase in re.split(self.SEPARATORS, query.strip(), flags=re.IGNORECASE):
+            if not phrase:
+                continue
+            # "binary search" is one tag, "bfs dfs" is two.
+            tag = self._match(phrase)
+            words = [tag] if tag else [self._match(word) for word in phrase.split()]
+            if not words or None in words:
+                return None
+            tags.extend(word for word in words if word not in tags)
+
+        if not tags or len(tags) > self.max_tags:
+            return None
+        return tags
+
+    def route(self, query: str, k: int):
+        """
+        Returns up to k problem names for a tag-only query, or None to fall back to full search.
+
+        With several tags, problems having more of the tags come first, then by the sum
+        of their similarity to each tag's centroid.
+        """
+        tags = self.match_tags(query)
+        if tags is None or any(tag not in self.problems for tag in tags):
+            return None
+
+        scores = {}
+        for tag in tags:
+            for problem in self.problems[tag]:
+                hits, total = scores.get(problem["problem_name"], (0, 0.0))
+                scores[problem["problem_name"]] = (hits + 1, total + problem["score"])
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], -item[1][1]))
+        return [name for name, _ in ranked[:k]]
+
+def get_tag_router():
+    """
+    Loads the precomputed tag index and returns a TagRouter, or None if it has not been built.
+    """
+    if not os.path.exists(config.TAG_INDEX_PATH):
+        print(f"⚠️ Tag index not found at '{config.TAG_INDEX_PATH}', tag routing disabled.")
+        print("Run 'create_tag_index.py' to build it.")
+        return None
+
+    with open(config.TAG_INDEX_PATH, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    print(f"✅ Tag router loaded with {len(index.get('tags', {}))} tags.")
+    return TagRouter(index)
@@ -0,0 +1,227 @@
+# search_smith/profiler.py
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
+from . import config
+
+PROFILE_HEADER = "x-profile"
+
+_current: ContextVar["RequestProfile | None"] = ContextVar("searchsmith_profile", default=None)
+
+class RequestProfile:
+    """
+    Profiling data for a single request: cProfile data of its worker threads
+    (attributed per request through contextvars), plus cProfile data of the
+    event loop when this request holds that profiler.
+
+    The event-loop profiler sees every coroutine running on that thread, including
+    those of concurrent requests, so overlapping_requests is recorded alongside it.
+    """
+
+    def __init__(self):
+        self.id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        self.main = cProfile.Profile()
+        self.event_loop_profiled = False
+        self.event_loop_note = None
+        self.overlapping_requests = 0
+        self.workers = []
+        self.worker_errors = 0
+        self._lock = threading.Lock()
+
+    def enable_event_loop(self) -> bool:
+        try:
+            self.main.enable()
+        except ValueError as e:
+            # Python >= 3.12 allows only one active cProfile per process.
+            self.event_loop_note = f"event-loop profiler unavailable: {e}"
+            return False
+        self.event_loop_profiled = True
+        return True
+
+    def add_worker(self, profile: cProfile.Profile):
+        with self._lock:
+            self.workers.append(profile)
+
+    def add_worker_error(self):
+        with self._lock:
+            self.worker_errors += 1
+
+    def save(self, meta: dict) -> str:
+        """
+        Writes the merged stats (.prof) and metadata (.json) to the profile directory
+        and evicts the oldest profiles beyond PROFILE_KEEP.
+        """
+        config.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+
+        stats = pstats.Stats()
+        for profile in ([self.main] if self.event_loop_profiled else []) + self.workers:
+            try:
+                stats.add(profile)
+            except TypeError:  # a profile that recorded no calls
+                pass
+        stats.dump_stats(str(config.PROFILE_DIR / f"{self.id}.prof"))
+
+        meta = {
+            "id": self.id,
+            **meta,
+            "event_loop_profiled": self.event_loop_profiled,
+            "event_loop_note": self.event_loop_note,
+            "overlapping_requests": self.overlapping_requests,
+            "worker_threads": len(self.workers),
+            "worker_threads_not_profiled": self.worker_errors,
+        }
+        with open(config.PROFILE_DIR / f"{self.id}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+
+        _evict_old_profiles()
+        return self.id
+
+def _evict_old_profiles():
+    # File names start with a timestamp, so sorting them gives the ring buffer order.
+    ids = sorted(path.stem for path in config.PROFILE_DIR.glob("*.json"))
+    for profile_id in ids[:-config.PROFILE_KEEP] if config.PROFILE_KEEP > 0 else ids:
+        for ext in (".prof", ".json"):
+            (config.PROFILE_DIR / f"{profile_id}{ext}").unlink(missing_ok=True)
+
+def profiled(func):
+    """
+    Wraps a function that runs on another thread so it is profiled too when the
+    current request is being profiled.
+    """
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        worker = cProfile.Profile()
+        try:
+            worker.enable()
+        except ValueError:
+            # On Python >= 3.12 another active profiler makes this fail; run the
+            # function unprofiled instead of failing the request, and count it.
+            profile.add_worker_error()
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            worker.disable()
+            profile.add_worker(worker)
+    return wrapper
+
+async def to_thread(func, *args, **kwargs):
+    """
+    asyncio.to_thread that also profiles the worker thread.
+    """
+    return await asyncio.to_thread(profiled(func), *args, **kwargs)
+
+def install_profiling(app: FastAPI):
+    """
+    Adds the profiling middleware and the /profiles endpoints when PROFILE_ENABLED is set.
+    Nothing is installed otherwise, so there is no overhead when profiling is off.
+    """
+    if not config.PROFILE_ENABLED:
+        return
+
+    # Only one request at a time can hold the event-loop profiler. Concurrent profiled
+    # requests still get their worker-thread data, and are marked as such in the
+    # metadata and in the X-Profile-Event-Loop header.
+    holder = None
+    in_flight = 0
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        nonlocal holder, in_flight
+        if holder is not None:
+            holder.overlapping_requests += 1
+        wanted = request.headers.get(PROFILE_HEADER) == "1" or random.random() < config.PROFILE_SAMPLE_RATE
+        if not wanted:
+            in_flight += 1
+            try:
+                return await call_next(request)
+            finally:
+                in_flight -= 1
+
+        profile = RequestProfile()
+        if holder is not None:
+            profile.event_loop_note = f"event-loop profiler held by request {holder.id}"
+        elif profile.enable_event_loop():
+            holder = profile
+            profile.overlapping_requests = in_flight
+
+        in_flight += 1
+        token = _current.set(profile)
+        start = time.perf_counter()
+        started_at = time.time()
+        status = None
+        response_ms = None
+
+        async def finish():
+            nonlocal holder, in_flight
+            in_flight -= 1
+            if holder is profile:
+                profile.main.disable()
+                holder = None
+            await asyncio.to_thread(profile.save, {
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "response_ms": response_ms,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "started_at": started_at,
+            })
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            await finish()
+            raise
+        finally:
+            _current.reset(token)
+        status = response.status_code
+        response_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        # The body is sent after the middleware returns, so keep profiling until it is done.
+        body_iterator = response.body_iterator
+
+        async def body():
+            try:
+                async for chunk in body_iterator:
+                    yield chunk
+            finally:
+                await finish()
+
+        response.body_iterator = body()
+        response.headers["X-Profile-Id"] = profile.id
+        response.headers["X-Profile-Event-Loop"] = "profiled" if profile.event_loop_profiled else "skipped"
+        return response
+
+    @app.get("/profiles")
+    async def list_profiles():
+        """
+        Lists the captured profiles, newest first.
+        """
+        if not config.PROFILE_DIR.is_dir():
+            return []
+        profiles = []
+        for path in sorted(config.PROFILE_DIR.glob("*.json"), reverse=True):
+            with open(path, "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        return profiles
+
+    @app.get("/profiles/{profile_id}")
+    async def download_profile(profile_id: str):
+        """
+        Downloads a captured profile in pstats format.
+        """
+        path = config.PROFILE_DIR / f"{os.path.basename(profile_id)}.prof"
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="Profile not found or evicted")
+        return FileResponse(str(path), media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -1,40 +1,127 @@
 # fastapi dev API.py
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, HTTPException, UploadFile
 from pydantic import BaseModel
-from toolSmith import generate_task
-from gitUpload import gitUpload
-from io import BytesIO
-import zipfile
+from typing import Literal
+from toolSmith import generate_task_entries, iter_task_entries
+from gitUpload import gitUpload, GitCommitter, REPO_PATH
+from zipStream import stream_zip
+from jobQueue import JobQueue
+from MD_PDF import PdfRenderer
+from metrics import install_profiling
+import asyncio
+import json
+import os
 
 app = FastAPI()
+install_profiling(app)
+
+job_queue = JobQueue(
+    lambda req, job: generate_task_entries(req, job.report, job.publish),
+    workers=int(os.getenv("TOOLSMITH_WORKERS", "2")),
+    max_pending=int(os.getenv("TOOLSMITH_MAX_PENDING", "100")),
+    ttl=float(os.getenv("TOOLSMITH_JOB_TTL", "3600")),
+)
+
+committer = GitCommitter(
+    REPO_PATH,
+    window=float(os.getenv("TOOLSMITH_COMMIT_WINDOW", "2")),
+    push=os.getenv("TOOLSMITH_GIT_PUSH", "1") == "1",
+)
+
+renderer = PdfRenderer(workers=int(os.getenv("MD_PDF_WORKERS", "2")))
+
+@app.on_event("startup")
+async def startup_event():
+    job_queue.start()
+    committer.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_queue.stop()
+    await committer.stop()
+    renderer.close()
 
 class contentName(BaseModel):
     content_name: str
     cases_size: int
     detail: str
+    compression: Literal["stored", "deflate"] = "deflate"
 
 @app.post("/tool-smith")
 async def task_gen(req: contentName):
-    task_files = await generate_task(req)
+    task_entries = iter_task_entries(req)
+    # รอไฟล์แรก (LLM ตอบจบแล้ว) ก่อนส่ง header เพื่อให้ error จาก LLM ยังตอบกลับเป็น HTTP error ได้ตามปกติ
+    first = await anext(task_entries)
 
-    buffer = BytesIO()
-    with zipfile.ZipFile(buffer, "w") as zipf:
-        for upload_file in task_files:
-            upload_file.file.seek(0)
-            zipf.writestr(upload_file.filename, upload_file.file.read())
-    buffer.seek(0)
+    async def entries():
+        yield first
+        try:
+            async for entry in task_entries:
+                yield entry
+        except Exception as e:
+            # ส่ง 200 ไปแล้วจึงเปลี่ยน status ไม่ได้ ตัดการเชื่อมต่อกลางคันโดยไม่เขียน central directory
+            # ให้ client เห็นว่า zip เสีย แทนที่จะได้ zip ที่เปิดได้แต่ไฟล์ไม่ครบแล้วเผลออัปโหลดขึ้น grader
+            print(f"❌ /tool-smith failed after streaming started: {type(e).__name__}: {e}")
+            raise
 
-    return StreamingResponse(buffer, media_type="application/zip", headers={
+    return StreamingResponse(stream_zip(entries(), compression=req.compression), media_type="application/zip", headers={
         "Content-Disposition": f"attachment; filename={req.content_name}_tasks.zip"
     })
 
+@app.post("/tool-smith/jobs", status_code=202)
+async def task_submit(req: contentName):
+    # คำขอที่เหมือนกันและยังทำไม่เสร็จจะได้ job เดียวกัน ไม่ต้องเรียก LLM ซ้ำ
+    key = (req.content_name, req.cases_size, req.detail)
+    try:
+        job = job_queue.submit(key, req)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Task generation queue is full, try again later")
+    return job.info()
+
+@app.get("/tool-smith/jobs/{job_id}")
+async def task_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.info()
+
+@app.get("/tool-smith/jobs/{job_id}/events")
+async def task_events(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    # Server-Sent Events: progress, ไฟล์แต่ละส่วนที่ LLM ตอบเสร็จ และ done/failed ตอนจบ
+    async def events():
+        async for event, data in job.follow():
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/tool-smith/jobs/{job_id}/result")
+async def task_result(job_id: str, compression: Literal["stored", "deflate"] = "deflate"):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    return StreamingResponse(stream_zip(job.result, compression=compression), media_type="application/zip", headers={
+        "Content-Disposition": f"attachment; filename={job.payload.content_name}_tasks.zip"
+    })
+
 @app.post("/grader-upload")
 async def task_gen(file: UploadFile = File(...)):
-    await gitUpload(file)
+    await gitUpload(file, committer, renderer)
     return "success"
 
+@app.get("/grader-upload/status")
+async def upload_status():
+    # "success" ของ /grader-upload หมายถึง stage แล้ว ส่วน commit/push ทำทีหลัง จึงตรวจผลได้ที่นี่
+    return committer.status()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
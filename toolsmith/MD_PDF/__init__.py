@@ -1 +1,2 @@
-from .main import MD_PDF
\ No newline at end of file
+from .main import MD_PDF, render_html, html_to_pdf, pdf_hash, pdf_executor, write_pdf_atomic
+from .service import PdfRenderer
\ No newline at end of file
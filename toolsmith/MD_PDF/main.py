@@ -1,15 +1,40 @@
 # pdf_converter.py
 
 import os
+import shutil
+import hashlib
+import tempfile
+import importlib.util
 import markdown
 import pdfkit
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
-# ตั้งค่า path ให้ wkhtmltopdf
-pdf_config = pdfkit.configuration(
-    wkhtmltopdf=os.path.join(os.path.dirname(os.path.abspath(__file__)), "wkhtmltopdf/bin/wkhtmltopdf.exe")
-)
+# backend ที่ใช้แปลง html เป็น pdf: wkhtmltopdf (ผ่าน pdfkit) หรือ weasyprint
+# weasyprint ไม่ได้มากับ pdfkit ต้องติดตั้งเพิ่มเอง (pip install weasyprint) ถ้าจะใช้
+PDF_BACKEND = os.getenv("MD_PDF_BACKEND", "wkhtmltopdf")
 
-def MD_PDF(md: str, output_pdf: str):
+BUNDLED_WKHTMLTOPDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wkhtmltopdf/bin/wkhtmltopdf.exe")
+
+_pdf_config = None
+
+def wkhtmltopdf_config():
+    """
+    หา wkhtmltopdf จาก WKHTMLTOPDF_PATH, ตัวที่มากับ repo (Windows) หรือใน PATH (Linux)
+    """
+    global _pdf_config
+    if _pdf_config is None:
+        path = os.getenv("WKHTMLTOPDF_PATH")
+        if not path:
+            if os.name == "nt" and os.path.exists(BUNDLED_WKHTMLTOPDF):
+                path = BUNDLED_WKHTMLTOPDF
+            else:
+                path = shutil.which("wkhtmltopdf")
+        if not path:
+            raise RuntimeError("wkhtmltopdf not found, install it or set WKHTMLTOPDF_PATH")
+        _pdf_config = pdfkit.configuration(wkhtmltopdf=path)
+    return _pdf_config
+
+def render_html(md: str) -> str:
     html_body = markdown.markdown(md, extensions=["extra"])
 
     html_template = f"""
@@ -50,4 +75,58 @@ def MD_PDF(md: str, output_pdf: str):
     </body>
     </html>
     """
-    pdfkit.from_string(html_template, output_pdf, configuration=pdf_config, options={'encoding': 'utf-8'})
+    return html_template
+
+def html_to_pdf(html: str, output_pdf: str, backend: str = PDF_BACKEND):
+    if backend == "weasyprint":
+        from weasyprint import HTML
+        HTML(string=html).write_pdf(output_pdf)
+    elif backend == "wkhtmltopdf":
+        pdfkit.from_string(html, output_pdf, configuration=wkhtmltopdf_config(), options={'encoding': 'utf-8'})
+    else:
+        raise ValueError(f"Unknown PDF backend '{backend}'")
+
+def check_backend(backend: str = PDF_BACKEND):
+    """
+    ตรวจ backend ตั้งแต่ตอนสร้าง pool ให้รู้ทันทีถ้าไม่ได้ติดตั้ง แทนที่จะพังตอน upload ครั้งแรก
+    """
+    if backend not in ("wkhtmltopdf", "weasyprint"):
+        raise ValueError(f"Unknown PDF backend '{backend}'")
+    if backend == "weasyprint" and importlib.util.find_spec("weasyprint") is None:
+        raise RuntimeError("MD_PDF_BACKEND=weasyprint but weasyprint is not installed (pip install weasyprint)")
+
+def warm_backend(backend: str = PDF_BACKEND):
+    # initializer ของ worker process: import weasyprint และโหลด font ไว้ครั้งเดียวต่อ process
+    if backend == "weasyprint":
+        from weasyprint import HTML
+        HTML(string=render_html("")).write_pdf()
+
+def pdf_executor(workers: int | None = None, backend: str = PDF_BACKEND) -> Executor:
+    """
+    สร้าง pool สำหรับแปลง pdf ตาม backend
+
+    wkhtmltopdf เปิด process ของตัวเองทุกครั้งที่แปลงอยู่แล้ว ฝั่ง Python แค่รอผล จึงใช้ thread ก็พอ
+    weasyprint แปลงใน Python เองและติด GIL จึงใช้ process ที่เปิดค้างไว้พร้อม weasyprint ที่โหลดแล้ว
+    """
+    check_backend(backend)
+    if backend == "weasyprint":
+        return ProcessPoolExecutor(max_workers=workers, initializer=warm_backend, initargs=(backend,))
+    return ThreadPoolExecutor(max_workers=workers)
+
+def pdf_hash(html: str, backend: str = PDF_BACKEND) -> str:
+    # html รวม markdown กับ template แล้ว เปลี่ยนอย่างใดอย่างหนึ่ง hash ก็เปลี่ยน
+    return hashlib.sha256(f"{backend}\0{html}".encode("utf-8")).hexdigest()
+
+def write_pdf_atomic(html: str, output_pdf: str, backend: str = PDF_BACKEND):
+    # เขียนลงไฟล์ชั่วคราวในโฟลเดอร์เดียวกันก่อนแล้วค่อย rename เพื่อไม่ให้เหลือ pdf ที่เขียนไม่เสร็จ
+    fd, tmp_path = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(output_pdf)))
+    os.close(fd)
+    try:
+        html_to_pdf(html, tmp_path, backend)
+        os.replace(tmp_path, output_pdf)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def MD_PDF(md: str, output_pdf: str):
+    html_to_pdf(render_html(md), output_pdf)
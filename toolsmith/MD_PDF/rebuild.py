@@ -0,0 +1,115 @@
+# python -m MD_PDF.rebuild path/to/woi-grader-archive
+
+from concurrent.futures import as_completed
+import argparse
+import json
+import time
+import sys
+import os
+from .main import PDF_BACKEND, render_html, pdf_executor, pdf_hash, write_pdf_atomic
+
+# เก็บ hash ของ pdf ที่สร้างแล้ว ไว้ที่ root ของ archive
+MANIFEST_NAME = ".pdf-manifest.json"
+
+def find_statements(archive: str) -> list[tuple[str, str]]:
+    """
+    หา Problems/*.md ทั้งหมดใน archive คืนค่าเป็นคู่ (path ของ md, path ของ pdf)
+    """
+    statements = []
+    for root, dirs, files in os.walk(archive):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        if os.path.basename(root) != "Problems":
+            continue
+        for name in sorted(files):
+            if name.lower().endswith(".md"):
+                md_path = os.path.join(root, name)
+                statements.append((md_path, os.path.splitext(md_path)[0] + ".pdf"))
+    return sorted(statements)
+
+def load_manifest(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_manifest(path: str, manifest: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _render(html: str, pdf_path: str, backend: str) -> float:
+    start = time.perf_counter()
+    write_pdf_atomic(html, pdf_path, backend)
+    return time.perf_counter() - start
+
+def rebuild(archive: str, workers: int | None = None, force: bool = False, backend: str = PDF_BACKEND) -> bool:
+    """
+    แปลงโจทย์ทุกข้อใน archive เป็น pdf แบบขนาน ข้ามข้อที่ pdf ยังตรงกับ hash เดิม
+    คืนค่า True ถ้าไม่มีข้อไหนล้มเหลว
+    """
+    manifest_path = os.path.join(archive, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    statements = find_statements(archive)
+    print(f"🔎 Found {len(statements)} statements in '{archive}'")
+
+    jobs = {}
+    skipped = 0
+    for md_path, pdf_path in statements:
+        with open(md_path, "r", encoding="utf-8") as f:
+            html = render_html(f.read())
+        key = os.path.relpath(pdf_path, archive).replace(os.sep, "/")
+        digest = pdf_hash(html, backend)
+        if not force and manifest.get(key) == digest and os.path.exists(pdf_path):
+            skipped += 1
+            continue
+        jobs[key] = (html, pdf_path, digest)
+
+    print(f"⏭️  {skipped} up to date, rendering {len(jobs)} with {workers or os.cpu_count()} workers...")
+
+    failures = []
+    render_seconds = 0.0
+    start = time.perf_counter()
+    try:
+        with pdf_executor(workers or os.cpu_count(), backend) as pool:
+            futures = {
+                pool.submit(_render, html, pdf_path, backend): key
+                for key, (html, pdf_path, _) in jobs.items()
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                key = futures[future]
+                try:
+                    render_seconds += future.result()
+                    manifest[key] = jobs[key][2]
+                    print(f"  [{done}/{len(jobs)}] ✅ {key}")
+                except Exception as e:
+                    failures.append((key, e))
+                    print(f"  [{done}/{len(jobs)}] ❌ {key}: {e}")
+    finally:
+        # บันทึกเท่าที่ทำเสร็จ แม้จะถูกขัดจังหวะกลางทาง
+        save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    rendered = len(jobs) - len(failures)
+    print(f"\n✨ Rendered {rendered}, skipped {skipped}, failed {len(failures)} in {elapsed:.1f}s")
+    if rendered:
+        print(f"   Throughput: {rendered / elapsed:.2f} PDFs/s (avg {render_seconds / rendered:.2f}s per PDF)")
+    for key, e in failures:
+        print(f"   ❌ {key}: {e}")
+
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-render every Problems/*.md in the grader archive to PDF.")
+    parser.add_argument("archive", help="path to the grader archive checkout")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of parallel renders (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-render even if the PDF is up to date")
+    parser.add_argument("--backend", default=PDF_BACKEND, choices=["wkhtmltopdf", "weasyprint"])
+    args = parser.parse_args()
+
+    ok = rebuild(args.archive, workers=args.workers, force=args.force, backend=args.backend)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
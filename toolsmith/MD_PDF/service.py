@@ -0,0 +1,108 @@
+import tempfile
+import asyncio
+import shutil
+import time
+import os
+import re
+from .main import PDF_BACKEND, render_html, pdf_executor, pdf_hash, write_pdf_atomic
+
+CACHE_DIR = os.getenv("MD_PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "toolsmith-pdf-cache"))
+# ขนาดรวมสูงสุดและอายุสูงสุด (วินาทีนับจากใช้ล่าสุด) ของ pdf ใน cache
+CACHE_MAX_BYTES = int(os.getenv("MD_PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_MAX_AGE = float(os.getenv("MD_PDF_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+
+# ไฟล์ใน cache ชื่อเป็น sha256 ส่วนไฟล์ชั่วคราวของ write_pdf_atomic ชื่อไม่ตรงรูปแบบนี้จึงไม่ถูกลบ
+_CACHE_FILE = re.compile(r"^[0-9a-f]{64}\.pdf$")
+
+class PdfRenderer:
+    """
+    แปลง markdown เป็น pdf ใน pool ที่เปิดค้างไว้ ไม่บล็อก event loop (ดู pdf_executor)
+
+    pdf ถูก cache ไว้ตาม hash ของ html (markdown + template) และ backend
+    จึง upload โจทย์เดิมซ้ำได้โดยไม่ต้องแปลงใหม่ cache ถูกลบแบบ LRU ตาม max_bytes และ max_age
+    """
+
+    def __init__(self, workers: int = 2, cache_dir: str = CACHE_DIR, backend: str = PDF_BACKEND,
+                 max_bytes: int = CACHE_MAX_BYTES, max_age: float = CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._pool = pdf_executor(workers, backend)
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._in_use: dict[str, int] = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_key(self, html: str) -> str:
+        return pdf_hash(html, self.backend)
+
+    async def render(self, md: str, output_pdf: str):
+        html = render_html(md)
+        key = self.cache_key(html)
+        cache_path = os.path.join(self.cache_dir, f"{key}.pdf")
+
+        rendered = False
+        # ครั้งที่สองเผื่อ pdf ถูก evict ไประหว่างที่เช็คว่ามีแล้วกับตอน copy
+        for attempt in range(2):
+            if not os.path.exists(cache_path):
+                # ถ้ามีคำขอ key เดียวกันกำลังแปลงอยู่ ก็รอตัวนั้นแทนการแปลงซ้ำ
+                future = self._inflight.get(key)
+                if future is None:
+                    loop = asyncio.get_running_loop()
+                    future = loop.run_in_executor(self._pool, write_pdf_atomic, html, cache_path, self.backend)
+                    self._inflight[key] = future
+                    future.add_done_callback(lambda _: self._inflight.pop(key, None))
+                    rendered = True
+                await asyncio.shield(future)
+
+            # กัน evict ไม่ให้ลบ pdf ที่กำลัง copy อยู่
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            try:
+                await asyncio.to_thread(self._copy, cache_path, output_pdf)
+                break
+            except FileNotFoundError:
+                if attempt:
+                    raise
+            finally:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+
+        if rendered:
+            # ลบเฉพาะตอนที่ cache โตขึ้น
+            await asyncio.to_thread(self.evict, set(self._inflight) | set(self._in_use))
+
+    def _copy(self, cache_path: str, output_pdf: str):
+        shutil.copyfile(cache_path, output_pdf)
+        # mtime คือเวลาที่ใช้ล่าสุด สำหรับ evict แบบ LRU
+        os.utime(cache_path)
+
+    def evict(self, keep: set[str] = frozenset()):
+        """
+        ลบ pdf ที่ไม่ได้ใช้นานเกิน max_age แล้วลบตัวที่ใช้ล่าสุดนานที่สุดจนขนาดรวมไม่เกิน max_bytes
+        ยกเว้น key ใน keep (กำลังแปลงหรือกำลัง copy อยู่)
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not _CACHE_FILE.match(entry.name) or entry.name[:-4] in keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_bytes and now - mtime <= self.max_age:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def close(self):
+        self._pool.shutdown(wait=True)
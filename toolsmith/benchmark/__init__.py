@@ -0,0 +1 @@
+from .fakeLLM import FakeTaskModel
\ No newline at end of file
@@ -0,0 +1,125 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any, AsyncIterator
+import asyncio
+import hashlib
+import time
+import re
+
+DELIMITER = "________________________________________"
+
+GENERATOR = '''def generate_test_cases(casesSize={cases_size}):
+    random.seed({seed})
+    inputs = []
+    outputs = []
+    for _ in range(casesSize):
+        n = {numbers}
+        values = [random.randint(-1000000, 1000000) for _ in range(n)]
+        inputs.append(str(n) + "\\n" + " ".join(map(str, values)) + "\\n")
+        outputs.append(str(sum(values)) + "\\n")
+    return [inputs, outputs]
+'''
+
+README = '''# {task_name}
+
+กาลครั้งหนึ่ง พ่อมดแห่งหอคอยตัวเลขต้องการรวมพลังเวทของลูกแก้ว {{n}} ลูก
+จงหาผลรวมของพลังเวททั้งหมด
+
+## ข้อมูลนำเข้า
+บรรทัดแรกมีจำนวนเต็ม n บรรทัดที่สองมีจำนวนเต็ม n จำนวน
+
+## ข้อมูลส่งออก
+ผลรวมของจำนวนทั้งหมด
+
+<table>
+<tr><th>Input</th><th>Output</th></tr>
+<tr><td>3<br>1 2 3</td><td>6</td></tr>
+</table>
+
+## ข้อกำหนด
+time limit 1000 ms, memory limit 256 MB
+'''
+
+SOLUTION = '''#include <bits/stdc++.h>
+using namespace std;
+
+int main() {
+    ios::sync_with_stdio(false);
+    cin.tie(nullptr);
+    long long n, x, total = 0;
+    cin >> n;
+    for (long long i = 0; i < n; i++) {
+        cin >> x;
+        total += x;
+    }
+    cout << total << "\\n";
+    return 0;
+}
+'''
+
+CONFIG = '''{{
+    "title": "{task_name}",
+    "timeLimit": 1000,
+    "memoryLimit": 256,
+    "note": "You can submit in C++ or Python. The output should match exactly."
+}}'''
+
+class FakeTaskModel(BaseChatModel):
+    """
+    Chat model ปลอมสำหรับ benchmark ตอบโจทย์ตามรูปแบบใน prompt.txt แบบ deterministic
+
+    ชื่อโจทย์และ seed ของ generator ได้จาก hash ของ prompt คำขอเดียวกันจึงได้คำตอบเดียวกันเสมอ
+    latency คือเวลารอก่อนได้ token แรก และ tokens_per_second คือความเร็วในการ stream
+    """
+
+    latency: float = 1.0
+    tokens_per_second: float = 200.0
+    chunk_chars: int = 16
+    numbers_per_case: int = 1000
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-task"
+
+    def build_task(self, messages: list[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        topic = re.search(r"\*\*(.+?)\*\*", prompt)
+        cases = re.search(r"จำนวน (\d+) เทสเคส", prompt)
+        task_name = "".join(
+            part.capitalize() for part in re.split(r"[^0-9A-Za-z]+", topic.group(1) if topic else "Task") if part
+        ) + digest[:6].upper()
+
+        sections = [
+            task_name,
+            GENERATOR.format(
+                cases_size=cases.group(1) if cases else 10,
+                seed=int(digest[:8], 16),
+                numbers=self.numbers_per_case,
+            ),
+            README.format(task_name=task_name),
+            SOLUTION,
+            CONFIG.format(task_name=task_name),
+        ]
+        return f"\n{DELIMITER}\n".join(sections)
+
+    def _chunks(self, text: str) -> list[str]:
+        return [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self.build_task(messages)
+        time.sleep(self.latency + len(self._chunks(text)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self.build_task(messages)
+        await asyncio.sleep(self.latency + len(self._chunks(text)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] | None = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text = self.build_task(messages)
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(text):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
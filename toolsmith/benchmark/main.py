@@ -0,0 +1,192 @@
+# python -m benchmark.main --requests 20 --concurrency 4
+
+from .fakeLLM import FakeTaskModel
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import zipfile
+import shutil
+import httpx
+import time
+import sys
+import io
+import os
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def setup_remote(workdir: str) -> str:
+    """
+    สร้าง bare repository ในเครื่องเป็น remote แทน GitHub แล้ว clone มาเป็น grader archive
+    คืนค่า path ของโฟลเดอร์ ToolSmith ใน clone
+    """
+    remote = os.path.join(workdir, "remote.git")
+    clone = os.path.join(workdir, "woi-grader-archive")
+    subprocess.run(["git", "init", "--bare", "-q", remote], check=True)
+    subprocess.run(["git", "clone", "-q", remote, clone], check=True, capture_output=True)
+    for key, value in [("user.name", "ToolSmith Bench"), ("user.email", "bench@localhost")]:
+        subprocess.run(["git", "config", key, value], cwd=clone, check=True)
+    subprocess.run(["git", "commit", "-q", "--allow-empty", "-m", "init"], cwd=clone, check=True)
+    subprocess.run(["git", "push", "-q", "-u", "origin", "HEAD"], cwd=clone, check=True, capture_output=True)
+
+    repo_path = os.path.join(clone, "ToolSmith")
+    os.makedirs(repo_path)
+    return repo_path
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def peak_rss_mb(who: int | None = None) -> float:
+    """
+    RUSAGE_SELF คือ process ของ server เอง ส่วน RUSAGE_CHILDREN คือ child ที่ใหญ่ที่สุด (ไม่ใช่ผลรวม)
+    ที่จบและถูก wait แล้ว เช่น g++, เฉลย C++, wkhtmltopdf และ worker ของ PDF pool
+    """
+    if resource is None:
+        return float("nan")
+    peak = resource.getrusage(resource.RUSAGE_SELF if who is None else who).ru_maxrss
+    # Linux รายงานเป็น KB ส่วน macOS เป็น bytes
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+async def run_load(request, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await request(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors}
+
+def report(name: str, result: dict, stages: dict, extra: dict | None = None):
+    latencies = result["latencies"]
+    print(f"\n=== {name} ===")
+    print(f"  requests     : {len(latencies)} ok, {len(result['errors'])} failed in {result['elapsed']:.2f}s")
+    print(f"  throughput   : {len(latencies) / result['elapsed']:.2f} req/s")
+    print(f"  latency p50  : {percentile(latencies, 50) * 1000:.0f} ms")
+    print(f"  latency p99  : {percentile(latencies, 99) * 1000:.0f} ms")
+    for key, value in (extra or {}).items():
+        print(f"  {key:<13}: {value}")
+    print(f"  peak RSS     : {peak_rss_mb():.1f} MB server process")
+    print(f"                 {peak_rss_mb(resource.RUSAGE_CHILDREN if resource else None):.1f} MB largest child process")
+    if stages:
+        print("  stages (count / mean / max / total):")
+        for stage, summary in stages.items():
+            print(f"    {stage:<28} {summary['count']:>5}  {summary['mean_s'] * 1000:>8.1f} ms  {summary['max_s'] * 1000:>8.1f} ms  {summary['total_s']:>8.2f} s")
+    for error in result["errors"][:5]:
+        print(f"  ❌ {error}")
+
+def strip_markdown(data: bytes) -> bytes:
+    src = zipfile.ZipFile(io.BytesIO(data))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as dst:
+        for info in src.infolist():
+            if not info.filename.lower().endswith(".md"):
+                dst.writestr(info, src.read(info))
+    return buffer.getvalue()
+
+async def benchmark(args):
+    workdir = tempfile.mkdtemp(prefix="toolsmith-bench-")
+    print(f"🔧 Working directory: {workdir}")
+
+    # ต้องตั้งค่าก่อน import API เพราะ API อ่านค่าเหล่านี้ตอน import
+    os.environ["TOOLSMITH_REPO_PATH"] = setup_remote(workdir)
+    os.environ["TOOLSMITH_COMMIT_WINDOW"] = str(args.commit_window)
+    os.environ["TOOLSMITH_WORKERS"] = str(args.concurrency)
+    os.environ.setdefault("TOOLSMITH_BUILD_DIR", os.path.join(workdir, "build"))
+    os.environ.setdefault("MD_PDF_CACHE_DIR", os.path.join(workdir, "pdf-cache"))
+
+    import API
+    from toolSmith import set_llm
+    from metrics import stage_summary, reset_stages
+
+    set_llm(FakeTaskModel(
+        latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        numbers_per_case=args.numbers,
+    ))
+
+    await API.startup_event()
+    try:
+        transport = httpx.ASGITransport(app=API.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://toolsmith", timeout=None) as client:
+            zips = []
+
+            async def tool_smith(i: int):
+                res = await client.post("/tool-smith", json={
+                    "content_name": f"bench topic {i}",
+                    "cases_size": args.cases,
+                    "detail": "",
+                })
+                res.raise_for_status()
+                zips.append(res.content)
+
+            reset_stages()
+            result = await run_load(tool_smith, args.requests, args.concurrency)
+            report("/tool-smith", result, stage_summary())
+
+            if not zips:
+                print("\n❌ No task zips generated, skipping /grader-upload")
+                return
+
+            if args.no_pdf or (os.getenv("MD_PDF_BACKEND", "wkhtmltopdf") == "wkhtmltopdf" and not shutil.which("wkhtmltopdf")):
+                print("\nℹ️  PDF rendering disabled (wkhtmltopdf not found or --no-pdf), uploading without README.md")
+                zips = [strip_markdown(data) for data in zips]
+
+            async def grader_upload(i: int):
+                res = await client.post("/grader-upload", files={
+                    "file": (f"bench{i}.zip", zips[i % len(zips)], "application/zip"),
+                })
+                res.raise_for_status()
+
+            reset_stages()
+            result = await run_load(grader_upload, args.requests, args.concurrency)
+            # เวลาที่ committer ใช้ commit/push งานที่ค้างหลังคำขอสุดท้ายตอบกลับ
+            drain_start = time.perf_counter()
+            await API.committer.flush()
+            drain = time.perf_counter() - drain_start
+            commits = subprocess.run(
+                ["git", "rev-list", "--count", "HEAD"], cwd=os.environ["TOOLSMITH_REPO_PATH"],
+                capture_output=True, text=True,
+            ).stdout.strip()
+            report("/grader-upload", result, stage_summary(), {
+                "commit drain": f"{drain:.2f}s",
+                "commits": commits,
+            })
+    finally:
+        await API.shutdown_event()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for /tool-smith and /grader-upload with a fake LLM and a local git remote.")
+    parser.add_argument("-n", "--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--cases", type=int, default=10, help="cases_size sent to /tool-smith")
+    parser.add_argument("--numbers", type=int, default=1000, help="numbers per generated test case")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="fake LLM time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake LLM streaming speed (chunks/s)")
+    parser.add_argument("--commit-window", type=float, default=0.5, help="TOOLSMITH_COMMIT_WINDOW for the run")
+    parser.add_argument("--no-pdf", action="store_true", help="upload without README.md so no PDF is rendered")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary remote and archive")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args))
+
+if __name__ == "__main__":
+    main()
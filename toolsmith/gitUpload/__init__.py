@@ -1 +1,2 @@
-from .main import gitUpload
\ No newline at end of file
+from .main import gitUpload, REPO_PATH
+from .committer import GitCommitter
\ No newline at end of file
@@ -0,0 +1,167 @@
+import subprocess
+import asyncio
+import os
+import metrics
+from metrics.profiler import run_subprocess, to_thread
+
+class GitCommitter:
+    """
+    ตัว commit/push แบบ background สำหรับ grader archive
+
+    ทุกคำสั่งที่แตะ index ของ git ทำภายใต้ lock เดียว การ upload ที่เข้ามาภายใน window วินาที
+    จะรวมเป็น commit เดียว แล้ว push แบบ asynchronous พร้อม retry
+    """
+
+    def __init__(self, repo_path: str, window: float = 2.0, push: bool = True,
+                 push_retries: int = 5, retry_delay: float = 2.0,
+                 max_retry_delay: float = 300.0, stop_timeout: float = 30.0):
+        self.repo_path = repo_path
+        self.window = window
+        self.push = push
+        self.push_retries = push_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stop_timeout = stop_timeout
+        self.lock = asyncio.Lock()
+        self._messages: list[str] = []
+        # upload ที่ commit แล้วแต่ยัง push ไม่สำเร็จ และ error ล่าสุด สำหรับ status()
+        self._unpushed: list[str] = []
+        self.last_error: str | None = None
+        self.failures = 0
+        self._pending = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        รอให้งานที่ค้าง commit/push เสร็จภายใน stop_timeout วินาที ถ้ายังไม่เสร็จ (เช่น กำลังรอ retry หลัง error)
+        จะหยุด loop แล้วลองอีกครั้งสุดท้ายแบบจำกัดเวลา ถ้ายังล้มเหลวก็แจ้ง upload ที่ค้างอยู่ แทนการปิดไปเงียบๆ
+        """
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout=self.window + self.stop_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        if self._messages or self._unpushed:
+            try:
+                await asyncio.wait_for(self._cycle(push_attempts=1), timeout=self.stop_timeout)
+            except Exception as e:
+                self._record_error(e)
+        if self._messages or self._unpushed:
+            print(f"❌ Shutting down with uploads missing from the remote: not committed {self._messages or '-'}, not pushed {self._unpushed or '-'}")
+        else:
+            self._idle.set()
+
+    async def stage(self, folder: str, message: str):
+        """
+        git add เฉพาะโฟลเดอร์ของโจทย์ที่ upload แล้วคืนค่าทันที ส่วน commit/push ทำใน background
+        """
+        async with self.lock:
+            await self._git("add", "--", os.path.relpath(folder, self.repo_path))
+            self._messages.append(message)
+            self._idle.clear()
+            self._pending.set()
+
+    def status(self) -> dict:
+        """
+        upload ที่ยังไม่ถูก commit, ที่ commit แล้วแต่ยังไม่ได้ push และ error ล่าสุดของ commit/push
+        """
+        return {
+            "pending": list(self._messages),
+            "unpushed": list(self._unpushed),
+            "last_error": self.last_error,
+            "failures": self.failures,
+        }
+
+    async def flush(self):
+        """
+        รอจนทุกอย่างที่ stage ไว้ถูก commit และ push แล้ว
+        """
+        await self._idle.wait()
+
+    async def _run(self):
+        while True:
+            await self._pending.wait()
+            # รอให้ upload ที่ตามมาติดๆ เข้ามารวมใน commit เดียวกัน
+            await asyncio.sleep(self.window)
+
+            try:
+                await self._cycle()
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                self._record_error(e)
+                # งานที่ค้างจะไม่มีใครมาทำต่อถ้าไม่มี upload ใหม่ จึงตั้งเวลาลองใหม่เองแบบ backoff
+                delay = min(self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay)
+                print(f"🔁 Retrying git commit/push in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                self._pending.set()
+            finally:
+                if not self._pending.is_set() and not self._messages and not self._unpushed:
+                    self._idle.set()
+
+    async def _cycle(self, push_attempts: int | None = None):
+        async with self.lock:
+            messages, self._messages = self._messages, []
+            self._pending.clear()
+            if messages:
+                try:
+                    with metrics.stage("upload.git_commit"):
+                        committed = await self._commit(messages)
+                except BaseException:
+                    # ไฟล์ยังถูก stage อยู่ ถ้าทิ้ง message ไป commit ของ upload ถัดไปจะกลืนไฟล์เหล่านี้ไปใต้ message ผิด
+                    self._messages[:0] = messages
+                    raise
+                if committed and self.push:
+                    self._unpushed.extend(messages)
+
+        # push รอบนี้รวม commit ที่ push ไม่สำเร็จจากรอบก่อนด้วย
+        if self._unpushed:
+            with metrics.stage("upload.git_push"):
+                await self._push(push_attempts or self.push_retries)
+            self._unpushed.clear()
+        self.last_error = None
+
+    def _record_error(self, e: BaseException):
+        detail = getattr(e, "stderr", None) or ""
+        self.last_error = f"{type(e).__name__}: {e} {detail}".strip()
+        print(f"❌ Git commit/push failed: {self.last_error}")
+        print(f"❌ Not committed: {self._messages or '-'}")
+        print(f"❌ Not pushed: {self._unpushed or '-'}")
+
+    async def _commit(self, messages: list[str]) -> bool:
+        # ไม่มีอะไรเปลี่ยน (เช่น upload ไฟล์เดิมซ้ำ) ก็ไม่ต้อง commit
+        staged = await self._git("diff", "--cached", "--quiet", check=False)
+        if staged.returncode == 0:
+            return False
+
+        if len(messages) == 1:
+            message = messages[0]
+        else:
+            message = f"From Tool Smith: {len(messages)} uploads\n\n" + "\n".join(messages)
+        await self._git("commit", "-m", message)
+        return True
+
+    async def _push(self, attempts: int):
+        for attempt in range(1, attempts + 1):
+            res = await self._git("push", check=False)
+            if res.returncode == 0:
+                return
+            print(f"⚠️ git push failed (attempt {attempt}/{attempts}): {res.stderr.strip()}")
+            if attempt < attempts:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+        raise RuntimeError(f"git push failed after {attempts} attempts: {res.stderr.strip()}")
+
+    async def _git(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        return await to_thread(
+            run_subprocess, ["git", *args], cwd=self.repo_path, check=check, capture_output=True, text=True
+        )
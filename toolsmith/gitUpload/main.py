@@ -2,108 +2,152 @@ from fastapi import UploadFile
 import os
 import zipfile
 import json
-from tempfile import TemporaryDirectory
-import shutil
-import subprocess
-from MD_PDF import MD_PDF
-
-REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "woi-grader-archive/ToolSmith")
-
-async def gitUpload(file: UploadFile):
-    with TemporaryDirectory() as tmpdir:
-        zip_path = os.path.join(tmpdir, file.filename)
-
-        # Save uploaded zip file
-        with open(zip_path, "wb") as f:
-            f.write(await file.read())
-
-        # เปิด zip อ่าน config.json และ title
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            config_filename = None
-            for name in zip_ref.namelist():
-                if name.endswith("config.json"):
-                    config_filename = name
-                    break
-
-            if config_filename is None:
-                raise ValueError("config.json not found in zip file")
-
-            with zip_ref.open(config_filename) as config_file:
-                config = json.load(config_file)
-                folder_name = config.get("title", "untitled").strip().replace(" ", "_")
-
-            dest_folder = os.path.join(REPO_PATH, folder_name)
-            os.makedirs(dest_folder, exist_ok=True)
-
-            # แตกไฟล์ทั้งหมดไปโฟลเดอร์ชั่วคราวก่อน
-            tmp_extract_folder = os.path.join(tmpdir, "extracted")
-            os.makedirs(tmp_extract_folder)
-            zip_ref.extractall(tmp_extract_folder)
-
-        # สร้างโฟลเดอร์โครงสร้างตามต้องการใน dest_folder
+import time
+import uuid
+from MD_PDF import PdfRenderer
+from .committer import GitCommitter
+from metrics import stage
+from metrics.profiler import record_subprocess, to_thread
+
+REPO_PATH = os.getenv(
+    "TOOLSMITH_REPO_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "woi-grader-archive/ToolSmith"),
+)
+
+# ขีดจำกัดของ zip ที่ upload เข้ามา กันไฟล์ใหญ่ผิดปกติหรือ zip bomb
+MAX_MEMBERS = int(os.getenv("TOOLSMITH_UPLOAD_MAX_MEMBERS", "2000"))
+MAX_UNCOMPRESSED_SIZE = int(os.getenv("TOOLSMITH_UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+
+async def gitUpload(file: UploadFile, committer: GitCommitter, renderer: PdfRenderer):
+    # UploadFile เก็บ body ไว้ใน SpooledTemporaryFile ที่ seek ได้ จึงเปิดเป็น zip ได้เลยโดยไม่ต้องเซฟซ้ำ
+    with stage("upload.extract"):
+        folder_name, dest_folder, md_content = await to_thread(extract_task, file.file, committer.repo_path)
+
+    if md_content is not None:
+        # แปลง pdf และเก็บใน Problems/(title).pdf
+        pdf_path = os.path.join(dest_folder, "Problems", f"{folder_name}.pdf")
+        start = time.perf_counter()
+        with stage("upload.pdf"):
+            await renderer.render(md_content, pdf_path)
+        # pdf ถูกแปลงใน pool ของ renderer (และ process ของ wkhtmltopdf) ที่ cProfile มองไม่เห็น จึงบันทึกเป็นเวลารวมแทน
+        record_subprocess("pdf-render", time.perf_counter() - start)
+
+    # git add เฉพาะโฟลเดอร์นี้ ส่วน commit และ push ทำใน background
+    with stage("upload.git_stage"):
+        await committer.stage(dest_folder, f"From Tool Smith: {file.filename} (as {folder_name})")
+
+def extract_task(fileobj, repo_path: str) -> tuple[str, str, str | None]:
+    """
+    แตก zip ของโจทย์ในรอบเดียวจาก central directory โดยเขียนแต่ละไฟล์ไปยังปลายทางตามชื่อ
+
+        *.md         -> Problems/(title).md (เฉพาะไฟล์แรก)
+        config.json  -> (title)/config.json
+        input*.txt   -> TestCases/Inputs
+        output*.txt  -> TestCases/Outputs
+        *.cpp        -> Solutions
+
+    แต่ละไฟล์ถูกเขียนเป็นไฟล์ชั่วคราวก่อน แล้ว rename ทับไฟล์ใน archive เมื่อแตกครบทุกไฟล์แล้วเท่านั้น
+    ถ้าล้มเหลวกลางทาง (เกินขนาด, CRC ผิด, .md ไม่ใช่ UTF-8) จะลบไฟล์ชั่วคราวและโฟลเดอร์ที่สร้างใหม่ทิ้ง
+    ไฟล์เดิมของโจทย์จึงไม่ถูกแตะ และ git add ครั้งถัดไปจะไม่เจอ upload ที่เขียนไม่ครบ
+
+    คืนค่า (ชื่อโฟลเดอร์, path โฟลเดอร์ปลายทาง, เนื้อหา markdown หรือ None)
+    """
+    with zipfile.ZipFile(fileobj, "r") as zip_ref:
+        members = [info for info in zip_ref.infolist() if not info.is_dir()]
+
+        if len(members) > MAX_MEMBERS:
+            raise ValueError(f"zip file has {len(members)} files, limit is {MAX_MEMBERS}")
+        declared_size = sum(info.file_size for info in members)
+        if declared_size > MAX_UNCOMPRESSED_SIZE:
+            raise ValueError(f"zip file uncompressed size {declared_size} bytes exceeds limit {MAX_UNCOMPRESSED_SIZE}")
+
+        config_info = next((info for info in members if info.filename.endswith("config.json")), None)
+        if config_info is None:
+            raise ValueError("config.json not found in zip file")
+
+        with zip_ref.open(config_info) as config_file:
+            config = json.load(config_file)
+            folder_name = config.get("title", "untitled").strip().replace(" ", "_")
+
+        dest_folder = os.path.join(repo_path, folder_name)
         problems_folder = os.path.join(dest_folder, "Problems")
         testcases_inputs_folder = os.path.join(dest_folder, "TestCases", "Inputs")
         testcases_outputs_folder = os.path.join(dest_folder, "TestCases", "Outputs")
         solutions_folder = os.path.join(dest_folder, "Solutions")
 
+        created = []
         for path in [problems_folder, testcases_inputs_folder, testcases_outputs_folder, solutions_folder]:
-            os.makedirs(path, exist_ok=True)
-
-        # หาไฟล์ .md ตัวแรกใน tmp_extract_folder เพื่อใช้แปลง pdf และก็ย้ายไป Problems
-        md_file_path = None
-        for root, _, files in os.walk(tmp_extract_folder):
-            for name in files:
-                if name.lower().endswith(".md"):
-                    md_file_path = os.path.join(root, name)
-                    break
-            if md_file_path:
-                break
-
-        if md_file_path:
-            # ย้าย .md ไป Problems/(title).md
-            md_dest_path = os.path.join(problems_folder, f"{folder_name}.md")
-            shutil.copy2(md_file_path, md_dest_path)
-
-            # แปลง pdf และเก็บใน Problems/(title).pdf
-            pdf_path = os.path.join(problems_folder, f"{folder_name}.pdf")
-            with open(md_file_path, "r", encoding="utf-8") as md_file:
-                md_content = md_file.read()
-            MD_PDF(md_content, pdf_path)
-
-        # ย้ายไฟล์ config.json ไปโฟลเดอร์หลัก
-        config_src_path = os.path.join(tmp_extract_folder, config_filename)
-        config_dest_path = os.path.join(dest_folder, "config.json")
-        shutil.copy2(config_src_path, config_dest_path)
-
-        # ย้ายไฟล์ input*.txt ไป TestCases/Inputs
-        for root, _, files in os.walk(tmp_extract_folder):
-            for name in files:
-                if name.startswith("input") and name.endswith(".txt"):
-                    src = os.path.join(root, name)
+            created.extend(_makedirs(path))
+
+        md_content = None
+        remaining = MAX_UNCOMPRESSED_SIZE
+        token = uuid.uuid4().hex[:8]
+        written = []  # (ไฟล์ชั่วคราว, ปลายทาง)
+        try:
+            for info in members:
+                name = os.path.basename(info.filename)
+                is_md = False
+
+                if info is config_info:
+                    dst = os.path.join(dest_folder, "config.json")
+                elif name.lower().endswith(".md"):
+                    if md_content is not None:
+                        continue
+                    is_md = True
+                    dst = os.path.join(problems_folder, f"{folder_name}.md")
+                elif name.startswith("input") and name.endswith(".txt"):
                     dst = os.path.join(testcases_inputs_folder, name)
-                    shutil.copy2(src, dst)
-
-        # ย้ายไฟล์ output*.txt ไป TestCases/Outputs
-        for root, _, files in os.walk(tmp_extract_folder):
-            for name in files:
-                if name.startswith("output") and name.endswith(".txt"):
-                    src = os.path.join(root, name)
+                elif name.startswith("output") and name.endswith(".txt"):
                     dst = os.path.join(testcases_outputs_folder, name)
-                    shutil.copy2(src, dst)
-
-        # ย้ายไฟล์ .cpp ทั้งหมดไป Solutions
-        for root, _, files in os.walk(tmp_extract_folder):
-            for name in files:
-                if name.lower().endswith(".cpp"):
-                    src = os.path.join(root, name)
+                elif name.lower().endswith(".cpp"):
                     dst = os.path.join(solutions_folder, name)
-                    shutil.copy2(src, dst)
-
-        # ทำ git add, commit, push
-        subprocess.run(["git", "add", "."], cwd=REPO_PATH, check=True)
-        subprocess.run(
-            ["git", "commit", "-m", f"From Tool Smith: {file.filename} (as {folder_name})"],
-            cwd=REPO_PATH,
-            check=True
-        )
-        subprocess.run(["git", "push"], cwd=REPO_PATH, check=True)
+                else:
+                    continue
+
+                tmp = f"{dst}.{token}.tmp"
+                written.append((tmp, dst))
+                chunks = [] if is_md else None
+                remaining -= _copy_member(zip_ref, info, tmp, remaining, chunks)
+                if is_md:
+                    md_content = b"".join(chunks).decode("utf-8")
+
+            for tmp, dst in written:
+                os.replace(tmp, dst)
+        except BaseException:
+            for tmp, _ in written:
+                try:
+                    os.remove(tmp)
+                except FileNotFoundError:
+                    pass
+            for path in reversed(created):
+                try:
+                    os.rmdir(path)
+                except OSError:
+                    pass
+            raise
+
+    return folder_name, dest_folder, md_content
+
+def _makedirs(path: str) -> list[str]:
+    # สร้างโฟลเดอร์และคืนรายชื่อโฟลเดอร์ที่สร้างใหม่จริง (จากบนลงล่าง) ไว้ลบทิ้งตอน rollback
+    missing = []
+    while not os.path.isdir(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+    for folder in reversed(missing):
+        os.makedirs(folder, exist_ok=True)
+    return list(reversed(missing))
+
+def _copy_member(zip_ref: zipfile.ZipFile, info: zipfile.ZipInfo, dst: str, limit: int, chunks: list | None) -> int:
+    # นับขนาดจริงระหว่างแตกไฟล์ด้วย เพราะขนาดใน central directory ปลอมได้
+    written = 0
+    with zip_ref.open(info) as src, open(dst, "wb") as out:
+        while chunk := src.read(CHUNK_SIZE):
+            written += len(chunk)
+            if written > limit:
+                raise ValueError(f"zip file uncompressed size exceeds limit {MAX_UNCOMPRESSED_SIZE}")
+            out.write(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+    return written
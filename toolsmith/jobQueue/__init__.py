@@ -0,0 +1 @@
+from .main import Job, JobQueue
\ No newline at end of file
@@ -0,0 +1,143 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+import asyncio
+import time
+import uuid
+
+@dataclass
+class Job:
+    id: str
+    key: Hashable
+    payload: Any
+    status: str = "queued"  # queued, running, done, failed
+    stage: str = "queued"
+    progress: float = 0.0
+    error: str | None = None
+    result: Any = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    events: list[tuple[str, dict]] = field(default_factory=list)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def info(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+        }
+
+    def report(self, stage: str, fraction: float):
+        self.stage = stage
+        self.progress = fraction
+        self.publish("progress", {"stage": stage, "progress": round(fraction, 3)})
+
+    def publish(self, event: str, data: dict):
+        """
+        เก็บ event ไว้ให้ผู้ติดตามที่เข้ามาทีหลังได้อ่านย้อนหลัง แล้วปลุกผู้ที่รออยู่
+        ต้องเรียกจาก event loop เท่านั้น
+        """
+        self.events.append((event, data))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def follow(self) -> AsyncIterator[tuple[str, dict]]:
+        """
+        อ่าน event ทั้งหมดตั้งแต่ต้นจนงานเสร็จ
+        """
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished_at is not None:
+                return
+            await self._changed.wait()
+
+Handler = Callable[[Any, Job], Awaitable[Any]]
+
+class JobQueue:
+    """
+    คิวงานแบบ asyncio ที่มี worker จำนวนจำกัด
+
+    งานที่ key เดียวกันและยังไม่เสร็จจะถูกรวมเป็นงานเดียว
+    ผลลัพธ์ของงานที่เสร็จแล้วเก็บไว้ได้นาน ttl วินาทีก่อนถูกลบ
+    """
+
+    def __init__(self, handler: Handler, workers: int = 2, max_pending: int = 100, ttl: float = 3600):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._queue: asyncio.Queue[Job] | None = None
+        self._jobs: dict[str, Job] = {}
+        self._inflight: dict[Hashable, Job] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        # สร้างคิวใน event loop ที่ใช้งานจริง
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def submit(self, key: Hashable, payload: Any) -> Job:
+        """
+        ส่งงานเข้าคิวและคืน Job ทันที ถ้ามีงาน key เดียวกันค้างอยู่จะคืนงานเดิม
+        raise asyncio.QueueFull เมื่อคิวเต็ม
+        """
+        self.evict_expired()
+
+        if key in self._inflight:
+            return self._inflight[key]
+
+        job = Job(id=uuid.uuid4().hex, key=key, payload=payload)
+        self._queue.put_nowait(job)
+        self._jobs[job.id] = job
+        self._inflight[key] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        self.evict_expired()
+        return self._jobs.get(job_id)
+
+    def evict_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+
+            try:
+                job.result = await self.handler(job.payload, job)
+                job.status = "done"
+                job.stage = "done"
+                job.progress = 1.0
+            except asyncio.CancelledError:
+                # ถูกยกเลิกตอน shutdown ต้องจบงานด้วย เพื่อไม่ให้ผู้ที่ติดตาม /events รอไปตลอด
+                job.status = "failed"
+                job.stage = "cancelled"
+                job.error = "Cancelled: server is shutting down"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.stage = "failed"
+                job.error = f"{type(e).__name__}: {e}"
+            finally:
+                self._inflight.pop(job.key, None)
+                self._queue.task_done()
+                job.finished_at = time.time()
+                job.publish(job.status, job.info())
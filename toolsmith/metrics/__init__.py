@@ -0,0 +1,2 @@
+from .main import stage, stage_summary, reset_stages
+from .profiler import install_profiling
\ No newline at end of file
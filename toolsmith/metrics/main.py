@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+import threading
+import time
+
+# เวลารวมของแต่ละขั้นตอน เก็บแค่ค่าสรุปเพื่อไม่ให้หน่วยความจำโตตามจำนวนคำขอ
+_stages: dict[str, tuple[int, float, float]] = {}
+_lock = threading.Lock()
+
+@contextmanager
+def stage(name: str):
+    """
+    จับเวลาขั้นตอน name ใช้ได้ทั้งใน event loop และใน worker thread
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            count, total, longest = _stages.get(name, (0, 0.0, 0.0))
+            _stages[name] = (count + 1, total + elapsed, max(longest, elapsed))
+
+def stage_summary() -> dict[str, dict]:
+    with _lock:
+        return {
+            name: {"count": count, "total_s": total, "mean_s": total / count, "max_s": longest}
+            for name, (count, total, longest) in sorted(_stages.items())
+        }
+
+def reset_stages():
+    with _lock:
+        _stages.clear()
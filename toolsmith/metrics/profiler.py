@@ -0,0 +1,249 @@
+from contextvars import ContextVar
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse
+import subprocess
+import threading
+import tempfile
+import cProfile
+import asyncio
+import pstats
+import random
+import json
+import time
+import uuid
+import os
+
+# เปิดด้วย TOOLSMITH_PROFILE=1 แล้วเลือกคำขอด้วย header X-Profile: 1 หรือสุ่มตาม sample rate
+PROFILE_ENABLED = os.getenv("TOOLSMITH_PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("TOOLSMITH_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("TOOLSMITH_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "toolsmith-profiles"))
+PROFILE_KEEP = int(os.getenv("TOOLSMITH_PROFILE_KEEP", "50"))
+PROFILE_HEADER = "x-profile"
+
+_current: ContextVar["RequestProfile | None"] = ContextVar("toolsmith_profile", default=None)
+
+class RequestProfile:
+    """
+    ข้อมูล profile ของคำขอเดียว: cProfile ของ worker thread และเวลาของ subprocess ที่คำขอนั้นเรียก
+    (แยกตามคำขอได้จริงผ่าน contextvars) และ cProfile ของ event loop ถ้าได้ถือ profiler ตัวนั้น
+
+    cProfile ของ event loop จับทุก coroutine ที่รันใน thread นั้น รวมถึงของคำขออื่นที่รันพร้อมกัน
+    จึงบันทึก overlapping_requests ไว้ใน metadata ให้รู้ว่าปนกับคำขออื่นมากแค่ไหน
+    """
+
+    def __init__(self):
+        self.id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        self.main = cProfile.Profile()
+        self.event_loop_profiled = False
+        self.event_loop_note: str | None = None
+        self.overlapping_requests = 0
+        self.workers: list[cProfile.Profile] = []
+        self.worker_errors = 0
+        self.subprocesses: list[dict] = []
+        self._lock = threading.Lock()
+
+    def enable_event_loop(self) -> bool:
+        try:
+            self.main.enable()
+        except ValueError as e:
+            # Python >= 3.12 เปิด cProfile ได้ทีละตัวทั้ง process
+            self.event_loop_note = f"event-loop profiler unavailable: {e}"
+            return False
+        self.event_loop_profiled = True
+        return True
+
+    def add_worker(self, profile: cProfile.Profile):
+        with self._lock:
+            self.workers.append(profile)
+
+    def add_worker_error(self):
+        with self._lock:
+            self.worker_errors += 1
+
+    def add_subprocess(self, name: str, seconds: float, returncode: int | None = None):
+        with self._lock:
+            self.subprocesses.append({"command": name, "seconds": round(seconds, 4), "returncode": returncode})
+
+    def save(self, meta: dict) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        stats = pstats.Stats()
+        for profile in ([self.main] if self.event_loop_profiled else []) + self.workers:
+            try:
+                stats.add(profile)
+            except TypeError:  # profile ที่ไม่ได้จับ call อะไรเลย
+                pass
+        stats.dump_stats(os.path.join(PROFILE_DIR, f"{self.id}.prof"))
+
+        meta = {
+            "id": self.id,
+            **meta,
+            "event_loop_profiled": self.event_loop_profiled,
+            "event_loop_note": self.event_loop_note,
+            "overlapping_requests": self.overlapping_requests,
+            "worker_threads": len(self.workers),
+            "worker_threads_not_profiled": self.worker_errors,
+            "subprocesses": self.subprocesses,
+        }
+        with open(os.path.join(PROFILE_DIR, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+
+        _evict_old_profiles()
+        return self.id
+
+def _evict_old_profiles():
+    # ring buffer บนดิสก์: เก็บแค่ PROFILE_KEEP อันล่าสุด (ชื่อไฟล์ขึ้นต้นด้วยเวลาจึงเรียงตามเวลาได้)
+    ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith(".json"))
+    for profile_id in ids[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else ids:
+        for ext in (".prof", ".json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + ext))
+            except FileNotFoundError:
+                pass
+
+def profiled(func):
+    """
+    ห่อฟังก์ชันที่จะรันใน thread อื่น ให้ถูก profile ด้วยถ้าคำขอปัจจุบันกำลังถูก profile
+    """
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        worker = cProfile.Profile()
+        try:
+            worker.enable()
+        except ValueError:
+            # Python >= 3.12 เปิด cProfile ได้ทีละตัวทั้ง process ถ้ามีตัวอื่นเปิดอยู่ก็รันต่อโดยไม่ profile
+            # thread นี้ แทนที่จะทำให้คำขอพัง แล้วนับไว้ใน metadata
+            profile.add_worker_error()
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            worker.disable()
+            profile.add_worker(worker)
+    return wrapper
+
+async def to_thread(func, *args, **kwargs):
+    # asyncio.to_thread ส่ง contextvars ต่อให้ thread อยู่แล้ว จึงรู้ว่าคำขอไหนกำลังถูก profile
+    return await asyncio.to_thread(profiled(func), *args, **kwargs)
+
+def run_subprocess(args: list[str], **kwargs) -> subprocess.CompletedProcess:
+    """
+    subprocess.run ที่บันทึกเวลาลง profile ของคำขอปัจจุบัน (cProfile มองไม่เห็นงานใน process อื่น)
+    """
+    profile = _current.get()
+    if profile is None:
+        return subprocess.run(args, **kwargs)
+
+    start = time.perf_counter()
+    returncode = None
+    try:
+        res = subprocess.run(args, **kwargs)
+        returncode = res.returncode
+        return res
+    finally:
+        profile.add_subprocess(" ".join(map(str, args))[:200], time.perf_counter() - start, returncode)
+
+def record_subprocess(name: str, seconds: float):
+    profile = _current.get()
+    if profile is not None:
+        profile.add_subprocess(name, seconds)
+
+def install_profiling(app: FastAPI):
+    """
+    ติดตั้ง middleware และ endpoint /profiles เฉพาะเมื่อเปิด TOOLSMITH_PROFILE
+    ถ้าไม่เปิดจะไม่มีอะไรถูกเพิ่มเลย จึงไม่มี overhead
+    """
+    if not PROFILE_ENABLED:
+        return
+
+    # cProfile ของ event loop ถือได้ทีละคำขอ คำขออื่นที่ขอ profile พร้อมกันยังได้ profile ของ worker thread
+    # และ subprocess ตามปกติ แต่ถูกระบุใน metadata และ header X-Profile-Event-Loop ว่าไม่ได้ profile event loop
+    holder: RequestProfile | None = None
+    in_flight = 0
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        nonlocal holder, in_flight
+        if holder is not None:
+            holder.overlapping_requests += 1
+        wanted = request.headers.get(PROFILE_HEADER) == "1" or random.random() < PROFILE_SAMPLE_RATE
+        if not wanted:
+            in_flight += 1
+            try:
+                return await call_next(request)
+            finally:
+                in_flight -= 1
+
+        profile = RequestProfile()
+        if holder is not None:
+            profile.event_loop_note = f"event-loop profiler held by request {holder.id}"
+        elif profile.enable_event_loop():
+            holder = profile
+            profile.overlapping_requests = in_flight
+
+        in_flight += 1
+        token = _current.set(profile)
+        start = time.perf_counter()
+        started_at = time.time()
+        status = None
+        response_ms = None
+
+        async def finish():
+            nonlocal holder, in_flight
+            in_flight -= 1
+            if holder is profile:
+                profile.main.disable()
+                holder = None
+            await asyncio.to_thread(profile.save, {
+                "method": request.method,
+                "path": request.url.path,
+                "status": status,
+                "response_ms": response_ms,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+                "started_at": started_at,
+            })
+
+        try:
+            response = await call_next(request)
+        except BaseException:
+            await finish()
+            raise
+        finally:
+            _current.reset(token)
+        status = response.status_code
+        response_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        # body (รวม StreamingResponse เช่น zip และ SSE) ถูกส่งหลัง middleware คืนค่า จึง profile ต่อจนส่ง body เสร็จ
+        body_iterator = response.body_iterator
+
+        async def body():
+            try:
+                async for chunk in body_iterator:
+                    yield chunk
+            finally:
+                await finish()
+
+        response.body_iterator = body()
+        response.headers["X-Profile-Id"] = profile.id
+        response.headers["X-Profile-Event-Loop"] = "profiled" if profile.event_loop_profiled else "skipped"
+        return response
+
+    @app.get("/profiles")
+    async def list_profiles():
+        if not os.path.isdir(PROFILE_DIR):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+            if name.endswith(".json"):
+                with open(os.path.join(PROFILE_DIR, name), "r", encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+        return profiles
+
+    @app.get("/profiles/{profile_id}")
+    async def download_profile(profile_id: str):
+        path = os.path.join(PROFILE_DIR, f"{os.path.basename(profile_id)}.prof")
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Profile not found or evicted")
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
@@ -1 +1 @@
-from .main import generate_task
\ No newline at end of file
+from .main import generate_task, generate_task_entries, iter_task_entries, get_llm, set_llm
\ No newline at end of file
@@ -4,19 +4,46 @@ from fastapi import UploadFile
 from pydantic import BaseModel
 from tempfile import SpooledTemporaryFile
 from dotenv import load_dotenv
+from .reference import reference_check
+from metrics import stage
+from metrics.profiler import to_thread
+from typing import AsyncIterator, Callable
 import asyncio
+import ast
+import re
+import json
 import os
 
 # init
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash")
+# สร้าง client ของ Gemini เมื่อใช้ครั้งแรก เพื่อให้ benchmark/test ใส่ chat model อื่นแทนได้ด้วย set_llm
+llm = None
+
+def get_llm():
+    global llm
+    if llm is None:
+        llm = ChatGoogleGenerativeAI(model=os.getenv("TOOLSMITH_LLM_MODEL", "gemini-2.0-flash"))
+    return llm
+
+def set_llm(model):
+    global llm
+    llm = model
 
 # Load prompt
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 with open(os.path.join(BASE_DIR, "prompt.txt"), "r", encoding="utf-8") as f:
     structure = f.read()
 
+DELIMITER = "________________________________________"
+# ลำดับไฟล์ตามที่ prompt.txt กำหนด
+SECTION_NAMES = ["task_name", "generate.py", "README.md", "solution.cpp", "config.json"]
+STREAM_GENERATION = os.getenv("TOOLSMITH_STREAM_GENERATION", "1") == "1"
+# จำนวนคำขอ LLM ที่ยิงพร้อมกัน, เวลารอ (วินาที) ก่อนยิงคำขอสำรอง (0 = ปิด) และจำนวนคำขอสูงสุดต่อโจทย์
+LLM_CANDIDATES = int(os.getenv("TOOLSMITH_LLM_CANDIDATES", "1"))
+LLM_HEDGE_AFTER = float(os.getenv("TOOLSMITH_LLM_HEDGE_AFTER", "0"))
+LLM_MAX_ATTEMPTS = int(os.getenv("TOOLSMITH_LLM_MAX_ATTEMPTS", "3"))
+
 # Call from API
 class requestFromUser(BaseModel):
     content_name: str
@@ -24,49 +51,262 @@ class requestFromUser(BaseModel):
     detail: str
 
 async def generate_task(request: requestFromUser) -> list[UploadFile]:
+    task_files = []
+    for name, content in await generate_task_entries(request):
+        upload = await to_thread(create_upload_file, name, content)
+        task_files.append(upload)
+
+    return task_files
+
+async def generate_task_entries(
+    request: requestFromUser,
+    progress: Callable[[str, float], None] | None = None,
+    publish: Callable[[str, dict], None] | None = None,
+    stream: bool = STREAM_GENERATION,
+) -> list[tuple[str, str]]:
+    """
+    รวบรวมไฟล์ทั้งหมดจาก iter_task_entries เป็น list สำหรับงานที่ต้องเก็บผลไว้ดาวน์โหลดซ้ำ
+    """
+    return [entry async for entry in iter_task_entries(request, progress, publish, stream)]
+
+async def iter_task_entries(
+    request: requestFromUser,
+    progress: Callable[[str, float], None] | None = None,
+    publish: Callable[[str, dict], None] | None = None,
+    stream: bool = STREAM_GENERATION,
+) -> AsyncIterator[tuple[str, str]]:
+    """
+    สร้างไฟล์ของโจทย์เป็นคู่ (ชื่อไฟล์, เนื้อหา) และ yield ทีละไฟล์ทันทีที่ไฟล์นั้นพร้อม
+    เพื่อให้ API ส่งต่อเข้า zip แบบ streaming โดยไม่ต้องรอทั้งโจทย์เสร็จ
+
+    README.md, .cpp และ config.json ออกมาก่อนเมื่อ LLM ตอบจบ ตามด้วย input ทีละเคส
+    ขณะที่เฉลย C++ กำลังรัน แล้วจึงเป็น reference_report.json และ output ทีละเคส
+    (ในโหมด use output มาจากเฉลย จึงต้องรอให้รันเสร็จก่อน)
+
+    progress(stage, fraction) จะถูกเรียกเมื่อเริ่มแต่ละขั้นตอน และ publish("section", ...)
+    เมื่อได้แต่ละไฟล์ครบ ในโหมด stream จะเริ่มสร้างเทสเคสทันทีที่ได้ generate.py
+    โดยไม่ต้องรอ LLM ตอบส่วนที่เหลือ
+    """
+    progress = progress or (lambda stage, fraction: None)
+    publish = publish or (lambda event, data: None)
     prompt = ChatPromptTemplate.from_messages([
         ("system", "คุณคือคนที่ต้องสร้างโจทย์ competitive programming โดยต้องทำตามโครงสร้างใน human message อย่างเคร่งครัด"),
         ("human", structure)
     ])
-    chain = prompt | llm
+    chain = prompt | get_llm()
 
     content_name = request.content_name.lower().replace(" ", "_")
     cases_size = request.cases_size
     detail = request.detail
-
-    res = await chain.ainvoke({
+    inputs = {
         "content": content_name,
         "casesSize": cases_size,
         "detail": detail
-    })
+    }
 
-    task_string = res.content.split("________________________________________")
-    task_name = task_string[0].replace("\n", "").replace(" ", "")
-    task_string.pop(0)
+    sections = []
+    testcases_task = None
+    reference_task = None
 
-    for i in [0, 2, 3]:
-        task_string[i] = backtickFilter(task_string[i])
+    def reset():
+        nonlocal testcases_task
+        sections.clear()
+        if testcases_task is not None:
+            testcases_task.cancel()
+            testcases_task = None
 
-    task_string[0] = importRandom(task_string[0])
-    testcases = await asyncio.to_thread(testcases_generate, task_string[0])
-    task_string.pop(0)
+    def on_section(text: str):
+        nonlocal testcases_task
+        index = len(sections)
+        if index >= len(SECTION_NAMES):
+            raise ValueError(f"LLM returned more than {len(SECTION_NAMES)} sections")
 
-    task_files = []
-    file_name = ["README.md", f"{task_name}.cpp", "config.json"]
+        if index == 0:
+            text = text.replace("\n", "").replace(" ", "")
+        elif index in (1, 3):
+            text = backtickFilter(text)
+        elif index == 4:
+            text = normalize_config(text)
+        if index == 1:
+            text = importRandom(text)
+            # generate.py มาก่อนไฟล์อื่น จึงเริ่มสร้างเทสเคสคู่ขนานกับ LLM ที่ยังตอบไม่จบได้เลย
+            progress("testcases", 0.25)
+            testcases_task = asyncio.ensure_future(to_thread(testcases_generate, text))
 
-    for file, name in zip(task_string, file_name):
-        upload = await asyncio.to_thread(create_upload_file, name, file)
-        task_files.append(upload)
-    
-    for i, input_content in enumerate(testcases[0]):
-        upload = await asyncio.to_thread(create_upload_file, f"input{str(i).zfill(2)}.txt", input_content)
-        task_files.append(upload)
+        sections.append(text)
+        file_name = f"{sections[0]}.cpp" if index == 3 else SECTION_NAMES[index]
+        publish("section", {"file": file_name, "content": text})
 
-    for i, output_content in enumerate(testcases[1]):
-        upload = await asyncio.to_thread(create_upload_file, f"output{str(i).zfill(2)}.txt", output_content)
-        task_files.append(upload)
+    def run_reference(cpp: str, config: str, testcases: list[list[str]]):
+        # รันเฉลย C++ กับ input ที่ได้ เพื่อตรวจ output ของ generator ก่อนถึงมือนักเรียน
+        with stage("toolsmith.reference"):
+            return reference_check(cpp, config, testcases[0], testcases[1])
 
-    return task_files
+    progress("llm", 0.0)
+    try:
+        with stage("toolsmith.llm"):
+            text = None
+            if stream and LLM_CANDIDATES == 1 and not LLM_HEDGE_AFTER:
+                # คำขอเดียวแบบ stream เริ่มงานต่อได้ทันทีทีละส่วน ถ้าผลออกมาไม่ถูกโครงสร้างค่อยขอใหม่
+                parser = SectionParser()
+                chunks = []
+                try:
+                    async for chunk in chain.astream(inputs):
+                        chunks.append(chunk.content)
+                        for section in parser.feed(chunk.content):
+                            on_section(section)
+                    on_section(parser.finish())
+                    validate_task_text("".join(chunks))
+                except ValueError as e:
+                    if LLM_MAX_ATTEMPTS <= 1:
+                        raise
+                    print(f"⚠️ Invalid LLM output, retrying: {e}")
+                    publish("retry", {"error": str(e)})
+                    reset()
+                    text = await first_valid_response(chain, inputs, max_attempts=LLM_MAX_ATTEMPTS - 1, stream=stream)
+            else:
+                text = await first_valid_response(chain, inputs, LLM_CANDIDATES, LLM_HEDGE_AFTER, LLM_MAX_ATTEMPTS, stream)
+
+            if text is not None:
+                for section in text.split(DELIMITER):
+                    on_section(section)
+
+        task_name, _, readme, cpp, config = sections
+        # ไฟล์จาก LLM ครบแล้ว ส่งออกไปก่อนระหว่างที่ generator ยังสร้างเทสเคสอยู่
+        yield "README.md", readme
+        yield f"{task_name}.cpp", cpp
+        yield "config.json", config
+
+        progress("testcases", 0.5)
+        # เวลาที่ยังต้องรอ generator หลัง LLM ตอบจบ (ส่วนที่ไม่ได้ทำคู่ขนาน)
+        with stage("toolsmith.testcases_wait"):
+            testcases = await testcases_task
+
+        progress("reference", 0.75)
+        reference_task = asyncio.ensure_future(to_thread(run_reference, cpp, config, testcases))
+
+        for i, input_content in enumerate(testcases[0]):
+            yield f"input{str(i).zfill(2)}.txt", input_content
+
+        outputs, reference_report = await reference_task
+        yield "reference_report.json", json.dumps(reference_report, indent=4)
+
+        for i, output_content in enumerate(outputs):
+            yield f"output{str(i).zfill(2)}.txt", output_content
+    finally:
+        # client ตัดการเชื่อมต่อหรือเกิด error กลางทาง ไม่ต้องรองานที่เหลือ
+        for task in (testcases_task, reference_task):
+            if task is not None and not task.done():
+                task.cancel()
+
+def validate_task_text(text: str):
+    """
+    ตรวจโครงสร้างคำตอบของ LLM ก่อนนำไปใช้ raise ValueError ถ้าไม่ถูกต้อง
+    """
+    sections = text.split(DELIMITER)
+    if len(sections) != len(SECTION_NAMES):
+        raise ValueError(f"LLM returned {len(sections)} sections, expected {len(SECTION_NAMES)}")
+
+    try:
+        tree = ast.parse(backtickFilter(sections[1]))
+    except SyntaxError as e:
+        raise ValueError(f"generate.py is not valid Python: {e}")
+    if not any(isinstance(node, ast.FunctionDef) and node.name == "generate_test_cases" for node in tree.body):
+        raise ValueError("No function named generate_test_cases found in generated code.")
+
+    normalize_config(sections[4])
+
+def normalize_config(text: str) -> str:
+    """
+    แปลง config.json จาก LLM ให้เป็น JSON ที่ถูกต้อง โดยตัด comment (# หรือ //) ที่อยู่นอก string
+    และเติม comma ที่ขาดระหว่าง field ก่อน parse raise ValueError ถ้ายังไม่ใช่ JSON object
+    """
+    text = backtickFilter(text)
+    text = re.sub(r'"(?:\\.|[^"\\])*"|(?:#|//)[^\n]*', lambda m: m.group(0) if m.group(0).startswith('"') else "", text)
+    text = re.sub(r'("|\d|true|false|null)(\s*\n\s*")', r"\1,\2", text)
+    try:
+        config = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"config.json is not valid JSON: {e}")
+    if not isinstance(config, dict):
+        raise ValueError("config.json is not a JSON object")
+    return json.dumps(config, indent=4, ensure_ascii=False)
+
+async def first_valid_response(
+    chain,
+    inputs: dict,
+    candidates: int = 1,
+    hedge_after: float = 0,
+    max_attempts: int = 1,
+    stream: bool = False,
+) -> str:
+    """
+    ยิงคำขอ LLM หลายตัวพร้อมกัน (candidates) และ/หรือยิงคำขอสำรองเมื่อรอเกิน hedge_after วินาที
+    คำตอบแรกที่ผ่าน validate_task_text ชนะ ส่วนคำขอที่เหลือจะถูกยกเลิก
+    """
+    async def candidate() -> str:
+        if stream:
+            return "".join([chunk.content async for chunk in chain.astream(inputs)])
+        return (await chain.ainvoke(inputs)).content
+
+    pending = set()
+    launched = 0
+    errors = []
+
+    def launch():
+        nonlocal launched
+        launched += 1
+        pending.add(asyncio.ensure_future(candidate()))
+
+    for _ in range(max(1, min(candidates, max_attempts))):
+        launch()
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after or None, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # ยังไม่มีคำตอบในเวลาที่กำหนด ยิงคำขอสำรองเพิ่ม
+                if launched < max_attempts:
+                    launch()
+                continue
+
+            for task in done:
+                pending.discard(task)
+                try:
+                    text = task.result()
+                    validate_task_text(text)
+                    return text
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+                    print(f"⚠️ LLM candidate rejected: {errors[-1]}")
+
+            if not pending and launched < max_attempts:
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    raise ValueError(f"No valid task after {launched} LLM attempts, last error: {errors[-1]}")
+
+class SectionParser:
+    """
+    แยกคำตอบของ LLM ตามตัวคั่นทีละส่วน ขณะที่ข้อความยังทยอย stream เข้ามา
+    """
+
+    def __init__(self, delimiter: str = None):
+        self.delimiter = delimiter or DELIMITER
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._buffer += text
+        sections = self._buffer.split(self.delimiter)
+        # ส่วนสุดท้ายอาจยังไม่จบ (หรือมีตัวคั่นมาไม่ครบ) จึงเก็บไว้ใน buffer ก่อน
+        self._buffer = sections.pop()
+        return sections
+
+    def finish(self) -> str:
+        text, self._buffer = self._buffer, ""
+        return text
 
 def create_upload_file(name: str, content: str) -> UploadFile:
     temp_file = SpooledTemporaryFile()
@@ -76,14 +316,15 @@ def create_upload_file(name: str, content: str) -> UploadFile:
 
 def testcases_generate(code: str) -> list[list[str], list[str]]:
     print(code)
-    local_vars = {}
-    exec(code, {}, local_vars)
+    with stage("toolsmith.testcases"):
+        local_vars = {}
+        exec(code, {}, local_vars)
 
-    if "generate_test_cases" not in local_vars:
-        raise ValueError("No function named generate_test_cases found in generated code.")
+        if "generate_test_cases" not in local_vars:
+            raise ValueError("No function named generate_test_cases found in generated code.")
 
-    generate_test_cases = local_vars["generate_test_cases"]
-    test_input, test_output = generate_test_cases()
+        generate_test_cases = local_vars["generate_test_cases"]
+        test_input, test_output = generate_test_cases()
     return [test_input, test_output]
 
 def importRandom(code: str):
@@ -0,0 +1,304 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from metrics.profiler import profiled, record_subprocess, run_subprocess
+import contextvars
+import subprocess
+import signal
+import threading
+import tempfile
+import hashlib
+import shutil
+import time
+import json
+import os
+import re
+
+# off = ไม่รันเฉลย, check = เทียบกับ output ของ generator, use = ใช้ output จากเฉลย C++ แทน
+REFERENCE_MODE = os.getenv("TOOLSMITH_REFERENCE_MODE", "check")
+BUILD_DIR = os.getenv("TOOLSMITH_BUILD_DIR", os.path.join(tempfile.gettempdir(), "toolsmith-build"))
+CXX = os.getenv("CXX", "g++")
+CXX_FLAGS = ["-O2", "-std=c++17"]
+COMPILE_TIMEOUT = float(os.getenv("TOOLSMITH_COMPILE_TIMEOUT", "60"))
+# binary ใน BUILD_DIR ถูกลบแบบ LRU เมื่อขนาดรวมเกินหรือไม่ได้ใช้นานเกินกำหนด (วินาที)
+BUILD_MAX_BYTES = int(os.getenv("TOOLSMITH_BUILD_MAX_BYTES", str(256 * 1024 * 1024)))
+BUILD_MAX_AGE = float(os.getenv("TOOLSMITH_BUILD_MAX_AGE", str(7 * 24 * 3600)))
+
+DEFAULT_TIME_LIMIT_MS = 1000
+DEFAULT_MEMORY_LIMIT_MB = 256
+# ปล่อยให้รันเกิน time limit ได้ระดับหนึ่งเพื่อวัดว่าช้าไปเท่าไร ก่อนจะ kill
+TIMEOUT_FACTOR = 3
+MEMORY_HEADROOM_MB = 64
+# pool เดียวทั้ง process สำหรับรันเฉลย ไม่ว่าจะมีกี่คำขอหรือกี่ job พร้อมกัน จำนวน binary ที่รันพร้อมกันไม่เกินจำนวน core
+RUN_WORKERS = int(os.getenv("TOOLSMITH_REFERENCE_WORKERS", str(os.cpu_count() or 1)))
+_run_pool = ThreadPoolExecutor(max_workers=RUN_WORKERS, thread_name_prefix="reference")
+
+# lock ต่อ digest พร้อมจำนวน thread ที่ถืออยู่ ลบทิ้งเมื่อไม่มีใครใช้แล้ว และจำนวนงานที่กำลังใช้ binary แต่ละตัว
+_compile_locks: dict[str, tuple[threading.Lock, int]] = {}
+_in_use: dict[str, int] = {}
+_build_guard = threading.Lock()
+_BINARY_NAME = re.compile(r"^([0-9a-f]{64})(\.exe)?$")
+
+@dataclass
+class CaseResult:
+    case: str
+    status: str  # OK, TLE, RE
+    time_ms: float  # CPU time ของเฉลย ใช้ตัดสิน TLE
+    output: str
+    stderr: str = ""
+    wall_ms: float = 0.0
+
+def source_digest(source: str) -> str:
+    return hashlib.sha256("\0".join([CXX, *CXX_FLAGS, source]).encode("utf-8")).hexdigest()
+
+def compile_solution(source: str) -> str:
+    """
+    คอมไพล์เฉลย C++ เพียงครั้งเดียวต่อ source โดย cache binary ไว้ตาม hash ของ source และ compiler flags
+    """
+    digest = source_digest(source)
+    binary = os.path.join(BUILD_DIR, digest + (".exe" if os.name == "nt" else ""))
+
+    with _build_guard:
+        lock, holders = _compile_locks.get(digest, (None, 0))
+        lock = lock or threading.Lock()
+        _compile_locks[digest] = (lock, holders + 1)
+
+    try:
+        with lock:
+            if os.path.exists(binary):
+                # mtime คือเวลาที่ใช้ล่าสุด สำหรับ evict แบบ LRU
+                os.utime(binary)
+                return binary
+
+            os.makedirs(BUILD_DIR, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=BUILD_DIR) as tmpdir:
+                src_path = os.path.join(tmpdir, "solution.cpp")
+                out_path = os.path.join(tmpdir, os.path.basename(binary))
+                with open(src_path, "w", encoding="utf-8") as f:
+                    f.write(source)
+
+                try:
+                    res = run_subprocess(
+                        [CXX, *CXX_FLAGS, src_path, "-o", out_path],
+                        capture_output=True, text=True, timeout=COMPILE_TIMEOUT,
+                    )
+                except subprocess.TimeoutExpired:
+                    raise ValueError(f"Reference solution did not compile within {COMPILE_TIMEOUT:g}s")
+                if res.returncode != 0:
+                    raise ValueError(f"Reference solution failed to compile:\n{res.stderr}")
+
+                # rename แบบ atomic เพื่อไม่ให้ process อื่นเห็น binary ที่เขียนไม่เสร็จ
+                os.replace(out_path, binary)
+    finally:
+        with _build_guard:
+            lock, holders = _compile_locks[digest]
+            if holders == 1:
+                del _compile_locks[digest]
+            else:
+                _compile_locks[digest] = (lock, holders - 1)
+
+    evict_builds()
+    return binary
+
+@contextmanager
+def solution_binary(source: str):
+    """
+    คอมไพล์ (หรือใช้จาก cache) แล้วกัน binary ไม่ให้ถูก evict_builds ลบระหว่างที่ยังรันเคสอยู่
+    """
+    digest = source_digest(source)
+    with _build_guard:
+        _in_use[digest] = _in_use.get(digest, 0) + 1
+    try:
+        yield compile_solution(source)
+    finally:
+        with _build_guard:
+            _in_use[digest] -= 1
+            if not _in_use[digest]:
+                del _in_use[digest]
+
+def evict_builds():
+    """
+    ลบ binary ที่ไม่ได้ใช้นานเกิน BUILD_MAX_AGE แล้วลบตัวที่ใช้ล่าสุดนานที่สุดจนขนาดรวมไม่เกิน BUILD_MAX_BYTES
+    """
+    now = time.time()
+    entries = []
+    for entry in os.scandir(BUILD_DIR):
+        match = _BINARY_NAME.match(entry.name)
+        if not match or not entry.is_file():
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, match.group(1), entry.path))
+
+    entries.sort()
+    total = sum(size for _, size, _, _ in entries)
+    for mtime, size, digest, path in entries:
+        if total <= BUILD_MAX_BYTES and now - mtime <= BUILD_MAX_AGE:
+            break
+        with _build_guard:
+            if digest in _in_use or digest in _compile_locks:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+def limited_command(binary: str, memory_limit_mb: int) -> list[str]:
+    """
+    คำสั่งรันเฉลยโดยจำกัดหน่วยความจำด้วย ulimit -v ของ shell แล้ว exec เป็นเฉลยแทน
+
+    ไม่ใช้ preexec_fn เพราะ run_case ถูกเรียกจาก thread pool ซึ่ง child อาจ deadlock ก่อน exec ได้
+    และ preexec_fn ยังทำให้ subprocess ใช้ posix_spawn/vfork ไม่ได้
+    """
+    if os.name != "posix":  # Windows ไม่มี ulimit จึงรันโดยไม่จำกัดหน่วยความจำ
+        return [binary]
+    memory_kb = (memory_limit_mb + MEMORY_HEADROOM_MB) * 1024
+    return ["sh", "-c", f'ulimit -v {memory_kb} && exec "$0"', binary]
+
+def run_case(binary: str, case: str, input_content: str, time_limit_ms: int, memory_limit_mb: int) -> CaseResult:
+    """
+    รันเฉลยกับ input หนึ่งเคส ตัดสิน TLE จาก CPU time ของ child (user + sys) ที่ได้จาก os.wait4
+    เพื่อไม่ให้เครื่องที่โหลดหนักหรือเวลา fork/exec ของ sh ทำให้ได้ TLE ปลอม
+    ส่วน wall time ใช้แค่ kill เคสที่ค้างนานเกิน TIMEOUT_FACTOR เท่าของ time limit
+    """
+    if not hasattr(os, "wait4"):  # Windows ไม่มี wait4 จึงใช้ wall time แทน
+        return _run_case_wall(binary, case, input_content, time_limit_ms)
+
+    with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        stdin.write(input_content.encode("utf-8"))
+        stdin.seek(0)
+
+        start = time.perf_counter()
+        proc = subprocess.Popen(limited_command(binary, memory_limit_mb), stdin=stdin, stdout=stdout, stderr=stderr)
+
+        # kill ได้เฉพาะก่อน reap เพื่อไม่ให้ไปโดน process อื่นที่ได้ pid ซ้ำ
+        guard = threading.Lock()
+        reaped = False
+        killed = False
+
+        def kill():
+            nonlocal killed
+            with guard:
+                if not reaped:
+                    os.kill(proc.pid, signal.SIGKILL)
+                    killed = True
+
+        timer = threading.Timer(time_limit_ms * TIMEOUT_FACTOR / 1000, kill)
+        timer.start()
+        try:
+            _, wait_status, usage = os.wait4(proc.pid, 0)
+        finally:
+            with guard:
+                reaped = True
+            timer.cancel()
+        proc.returncode = os.waitstatus_to_exitcode(wait_status)
+        wall_ms = (time.perf_counter() - start) * 1000
+        record_subprocess(f"reference {case}", wall_ms / 1000)
+
+        cpu_ms = (usage.ru_utime + usage.ru_stime) * 1000
+        stdout.seek(0)
+        output = stdout.read().decode("utf-8", errors="replace")
+        stderr.seek(0)
+        error = stderr.read()[-1000:].decode("utf-8", errors="replace")
+
+    if killed or cpu_ms > time_limit_ms:
+        return CaseResult(case, "TLE", cpu_ms, output if not killed else "", wall_ms=wall_ms)
+    if proc.returncode != 0:
+        return CaseResult(case, "RE", cpu_ms, output, error, wall_ms=wall_ms)
+    return CaseResult(case, "OK", cpu_ms, output, wall_ms=wall_ms)
+
+def _run_case_wall(binary: str, case: str, input_content: str, time_limit_ms: int) -> CaseResult:
+    start = time.perf_counter()
+    try:
+        res = run_subprocess(
+            [binary],
+            input=input_content,
+            capture_output=True,
+            text=True,
+            timeout=time_limit_ms * TIMEOUT_FACTOR / 1000,
+        )
+    except subprocess.TimeoutExpired:
+        elapsed = (time.perf_counter() - start) * 1000
+        return CaseResult(case, "TLE", elapsed, "", wall_ms=elapsed)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if res.returncode != 0:
+        return CaseResult(case, "RE", elapsed, res.stdout, res.stderr[-1000:], wall_ms=elapsed)
+    if elapsed > time_limit_ms:
+        return CaseResult(case, "TLE", elapsed, res.stdout, wall_ms=elapsed)
+    return CaseResult(case, "OK", elapsed, res.stdout, wall_ms=elapsed)
+
+def run_solution(binary: str, inputs: list[str], time_limit_ms: int, memory_limit_mb: int) -> list[CaseResult]:
+    """
+    รันเฉลยกับ input ทุกเคสแบบขนานใน pool ที่ใช้ร่วมกันทั้ง process
+    """
+    # ThreadPoolExecutor ไม่ส่ง contextvars ต่อให้เอง จึง copy context แยกให้แต่ละเคส
+    futures = [
+        _run_pool.submit(contextvars.copy_context().run, profiled(run_case), binary, str(i).zfill(2), input_content, time_limit_ms, memory_limit_mb)
+        for i, input_content in enumerate(inputs)
+    ]
+    return [future.result() for future in futures]
+
+def read_limits(config_text: str) -> tuple[int, int]:
+    # config.json ผ่าน normalize_config มาแล้ว จึงเป็น JSON ที่ถูกต้องเสมอ
+    config = json.loads(config_text)
+    return int(config.get("timeLimit", DEFAULT_TIME_LIMIT_MS)), int(config.get("memoryLimit", DEFAULT_MEMORY_LIMIT_MB))
+
+def same_output(a: str, b: str) -> bool:
+    # เทียบแบบเดียวกับ judge ทั่วไป คือไม่สนใจช่องว่างท้ายบรรทัดและบรรทัดว่างท้ายไฟล์
+    def normalize(text: str) -> list[str]:
+        return [line.rstrip() for line in text.rstrip().splitlines()]
+    return normalize(a) == normalize(b)
+
+def reference_check(cpp_source: str, config_text: str, inputs: list[str], outputs: list[str], mode: str = REFERENCE_MODE) -> tuple[list[str], dict]:
+    """
+    รันเฉลย C++ กับ input ทั้งหมดแล้วเทียบ (check) หรือแทนที่ (use) output ของ generator
+
+    คืนค่า (outputs ที่จะใช้, report) โดย report มีเวลาแต่ละเคสเทียบกับ timeLimit ใน config.json
+    """
+    time_limit_ms, memory_limit_mb = read_limits(config_text)
+    report = {"mode": mode, "timeLimit": time_limit_ms, "memoryLimit": memory_limit_mb}
+
+    if mode == "off":
+        report["status"] = "skipped"
+        return outputs, report
+    if shutil.which(CXX) is None:
+        print(f"⚠️ Compiler '{CXX}' not found, skipping reference solution stage")
+        report["status"] = "skipped"
+        return outputs, report
+
+    try:
+        with solution_binary(cpp_source) as binary:
+            results = run_solution(binary, inputs, time_limit_ms, memory_limit_mb)
+    except ValueError as e:
+        print(f"❌ {e}")
+        report["status"] = "compile_error"
+        report["error"] = str(e)
+        return outputs, report
+
+    final_outputs = list(outputs)
+    cases = []
+    for i, result in enumerate(results):
+        expected = outputs[i] if i < len(outputs) else None
+        matches = expected is not None and result.status == "OK" and same_output(result.output, expected)
+        if mode == "use" and result.status == "OK":
+            if i < len(final_outputs):
+                final_outputs[i] = result.output
+            else:
+                final_outputs.append(result.output)
+
+        case = asdict(result)
+        case.pop("output")
+        case["time_ms"] = round(result.time_ms, 2)
+        case["wall_ms"] = round(result.wall_ms, 2)
+        case["matches_generator"] = matches
+        cases.append(case)
+        print(f"  case {result.case}: {result.status} {result.time_ms:.1f} ms CPU ({result.wall_ms:.1f} ms wall) / {time_limit_ms} ms" + ("" if matches else " (mismatch)"))
+
+    report["status"] = "ok" if all(case["status"] == "OK" and case["matches_generator"] for case in cases) else "failed"
+    report["maxTimeMs"] = max((case["time_ms"] for case in cases), default=0)
+    report["cases"] = cases
+    return final_outputs, report
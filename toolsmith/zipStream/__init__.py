@@ -0,0 +1 @@
+from .main import stream_zip, COMPRESSION
\ No newline at end of file
@@ -0,0 +1,99 @@
+from typing import AsyncIterable, AsyncIterator, Iterable, Union
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+# ชื่อระดับการบีบอัดที่ client เลือกได้
+COMPRESSION = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+}
+
+Entry = tuple[str, Union[str, bytes, object]]
+
+class _ChunkSink:
+    """Write-only sink ที่ไม่มี tell()/seek() เพื่อให้ zipfile เขียนแบบ streaming (data descriptor)"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def stream_zip(
+    entries: Union[Iterable[Entry], AsyncIterable[Entry]],
+    compression: str = "deflate",
+    compresslevel: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    สร้าง zip แบบ streaming ส่งออกทีละ chunk โดยไม่ถือทั้ง archive ไว้ในหน่วยความจำ
+
+    entries เป็น (ชื่อไฟล์, ข้อมูล) โดยข้อมูลเป็น str, bytes, file-like object
+    หรือ iterable/async iterable ของ bytes ก็ได้
+    """
+    if compression not in COMPRESSION:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {sorted(COMPRESSION)}")
+
+    sink = _ChunkSink()
+    zipf = zipfile.ZipFile(
+        sink, "w",
+        compression=COMPRESSION[compression],
+        compresslevel=compresslevel if compression != "stored" else None,
+    )
+
+    async for name, data in _aiter(entries):
+        # ไม่รู้ขนาดล่วงหน้า จึงเปิด zip64 ไว้เสมอเพื่อรองรับไฟล์ใหญ่เกิน 4GB
+        with zipf.open(name, "w", force_zip64=True) as dest:
+            async for chunk in _iter_chunks(data, chunk_size):
+                dest.write(chunk)
+                out = sink.drain()
+                if out:
+                    yield out
+        out = sink.drain()
+        if out:
+            yield out
+
+    # central directory
+    zipf.close()
+    out = sink.drain()
+    if out:
+        yield out
+
+async def _aiter(items):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+async def _iter_chunks(data, chunk_size: int) -> AsyncIterator[bytes]:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+    elif hasattr(data, "read"):
+        if hasattr(data, "seek"):
+            data.seek(0)
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+    else:
+        async for chunk in _aiter(data):
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk